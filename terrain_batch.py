@@ -0,0 +1,208 @@
+# Runs the terrain tile steps from terrain_tiles_beta.py without the UI, for build machines
+# blender --background world.blend --python terrain_batch.py -- --steps origin,chess,borders --tiles "A*" --save
+
+import bpy
+import sys
+import os
+import time
+import json
+import fnmatch
+import argparse
+import addon_utils
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import terrain_tiles_beta as terrain
+
+#step name -> (function, addons it needs)
+stages = {
+    'origin': (terrain.origin_to_geo_grid, []),
+    'chess': (terrain.name_numbers_to_chess_all_objects, []),
+    'borders': (terrain.get_border_verts_every, []),
+    'falloff': (terrain.border_falloff_all_objects, []),
+    'uv': (terrain.project_uv_all_objects, []),
+    'slope': (terrain.calc_slope_all_objects, ['ant_landscape']),
+    'slopes': (terrain.slope_all_objects, []),
+    'erosion': (terrain.calc_erosion_all_objects, ['ant_landscape']),
+    'erode': (terrain.erode_all_objects, []),
+    'random': (terrain.random_vertex_group_all_objects, []),
+    'bleed': (terrain.bleed_vertex_group_all_objects, []),
+    'seams': (terrain.bleed_seams_all_objects, []),
+    'export': (terrain.ExportColTex, []),
+    'export_tiles': (terrain.ExportColTexSelected, []),
+    'raster': (terrain.ExportWeightTexSelected, []),
+    'splat': (terrain.ExportSplatSelected, []),
+    'manifest': (terrain.write_tile_manifest, []),
+    'store': (terrain.store_weights_selected, []),
+    'load': (terrain.load_weights_selected, []),
+}
+#step -> (vertex groups it reads, whether neighbor borders matter) for --incremental
+#'hash_groups' in terrain_tiles_beta explains the group values, steps not listed always run
+stage_inputs = {
+    'borders': (None, False),
+    'falloff': ('active', False),
+    #uv runs with per tile bounds; with world=True every tile would depend on the whole grid's extent
+    'uv': (None, False),
+    'slope': (None, False),
+    'slopes': (None, True),
+    'erosion': (['rainmap'], False),
+    'erode': (['rainmap'], False),
+    'random': ('active', False),
+    #'bleed' is left out: the right-only bleed cannot be limited to some seams, it always runs on every tile
+    'seams': ('active', True),
+    'export_tiles': ('active', False),
+    'raster': ('active', False),
+    'splat': ('all', False),
+    'store': ('all', False),
+}
+#neighbor steps that can load tiles around the ones they run on: step -> function(context tiles)
+#slopes only writes the run tiles, seams bleeds the run tiles' seams and writes whichever tiles changed
+context_stages = {
+    'slopes': lambda context: terrain.slope_all_objects(context=context),
+    'seams': lambda context: terrain.bleed_seams_all_objects(context=context),
+}
+#steps that reach neighbors only through the seams of the run tiles, their dirty tiles are not widened
+seam_stages = ['seams']
+#steps that only write files, their hashes hold without saving the .blend
+export_steps = ['export', 'export_tiles', 'raster', 'splat', 'manifest', 'store']
+#ant landscape moved to the extensions platform in 4.2
+addon_modules = {'ant_landscape': ['ant_landscape', 'bl_ext.blender_org.antlandscape']}
+
+def enable_addon(name):
+    for module in addon_modules.get(name, [name]):
+        try:
+            if addon_utils.enable(module, default_set=False) is not None:
+                return True
+        except Exception:
+            continue
+    print('could not enable addon ' + name)
+    return False
+def find_tiles(patterns=None, selected=False):
+    if selected:
+        objects = [obj for obj in bpy.context.selected_objects if obj.type == 'MESH']
+    else:
+        objects = [obj for obj in bpy.context.scene.objects if obj.type == 'MESH']
+    if patterns:
+        #first:last picks a registry range, anything else is a name pattern
+        names = set(name for p in patterns if ':' in p for name in terrain.tiles.select(p))
+        objects = [obj for obj in objects if obj.name in names or any(':' not in p and fnmatch.fnmatchcase(obj.name, p) for p in patterns)]
+    objects.sort(key=lambda obj: obj.name)
+    return objects
+def select_tiles(objects):
+    if bpy.context.object is not None and bpy.context.object.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode='OBJECT')
+    bpy.ops.object.select_all(action='DESELECT')
+    for obj in objects:
+        obj.select_set(True)
+    if len(objects) > 0:
+        bpy.context.view_layer.objects.active = objects[0]
+def hashes_path():
+    #sidecar next to the .blend, None for unsaved files
+    if not bpy.data.filepath:
+        return None
+    return bpy.data.filepath + '.tiles.json'
+def load_hashes(path):
+    if path is None or not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file).get('stages', {})
+def save_hashes(path, hashes):
+    with open(path, 'w') as file:
+        json.dump({'stages': hashes}, file, indent=2, sort_keys=True)
+def stage_hashes(step, objects, grid=None):
+    groups, neighbors = stage_inputs[step]
+    function = stages[step][0]
+    params = (step, function.__name__, repr(function.__defaults__))
+    return {obj.name: terrain.tile_input_hash(obj, groups, grid.relations(obj) if neighbors else (), params) for obj in objects}
+def dirty_tiles(step, objects, recorded, grid=None):
+    #tiles whose inputs changed since the step last ran, plus their neighbors for steps that work across seams
+    current = stage_hashes(step, objects, grid)
+    dirty = [obj for obj in objects if recorded.get(obj.name) != current[obj.name]]
+    if stage_inputs[step][1] and dirty and step not in seam_stages:
+        names = set(obj.name for obj in dirty)
+        for obj in list(dirty):
+            names.update(neighbor.name for neighbor in grid.relations(obj) if neighbor is not None)
+        dirty = [obj for obj in objects if obj.name in names]
+    return dirty, current
+def ring(grid, objects):
+    #tiles in the 8 cells around the objects that are not objects themselves, corners need the diagonals
+    names = set(obj.name for obj in objects)
+    found = {}
+    for obj in objects:
+        x, y = grid.coord(obj)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                other = grid.get(x + dx, y + dy)
+                if other is not None and other.name not in names:
+                    found[other.name] = other
+    return list(found.values())
+def run_stages(steps, objects, hashes=None):
+    #returns [(step, seconds)], objects are reselected before every step since the steps change selection
+    #with hashes ({step: {tile: hash}}) tiles whose inputs did not change are skipped and hashes is updated
+    timings = []
+    for step in steps:
+        function, addons = stages[step]
+        for addon in addons:
+            enable_addon(addon)
+        start = time.perf_counter()
+        run = objects
+        grid = None
+        if hashes is not None and step in stage_inputs:
+            grid = terrain.TileGrid(objects) if stage_inputs[step][1] else None
+            run, current = dirty_tiles(step, objects, hashes.get(step, {}), grid)
+        context = ring(grid, run) if grid is not None else []
+        if len(run) > 0:
+            select_tiles(run)
+            if grid is not None and step in context_stages:
+                context_stages[step](context)
+            else:
+                function()
+        if hashes is not None and step in stage_inputs:
+            #hashed after the step so its own writes count as the recorded state
+            current.update(stage_hashes(step, run + context, grid))
+            #merged, tiles outside this run's --tiles keep their hashes
+            recorded = hashes.setdefault(step, {})
+            recorded.update(current)
+        seconds = time.perf_counter() - start
+        timings.append((step, seconds))
+        print('%-10s %10.3fs  (%d of %d tiles)' % (step, seconds, len(run), len(objects)))
+    return timings
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='terrain_batch.py', description='run terrain tile steps headless')
+    parser.add_argument('--steps', default='', help='comma separated, in order: ' + ','.join(stages.keys()))
+    parser.add_argument('--tiles', default='', help='comma separated name patterns or ranges, e.g. A*,B0A0,C0A0:D9B1 (default all meshes)')
+    parser.add_argument('--selected', action='store_true', help='start from the selection saved in the file')
+    parser.add_argument('--report', default='', help='write per stage timings as json')
+    parser.add_argument('--save', action='store_true', help='save the .blend when done')
+    parser.add_argument('--incremental', action='store_true', help='skip tiles whose inputs hash the same as last run (<blend>.tiles.json)')
+    args = parser.parse_args(argv)
+    args.steps = [step for step in args.steps.split(',') if step]
+    args.tiles = [tile for tile in args.tiles.split(',') if tile]
+    for step in args.steps:
+        if step not in stages:
+            parser.error('unknown step ' + step)
+    return args
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    args = parse_args(argv)
+    objects = find_tiles(args.tiles, args.selected)
+    print('terrain_batch: %d tiles, steps %s' % (len(objects), ','.join(args.steps)))
+    path = hashes_path() if args.incremental else None
+    if args.incremental and path is None:
+        print('terrain_batch: --incremental needs a saved .blend, running every tile')
+    hashes = load_hashes(path) if path is not None else None
+    start = time.perf_counter()
+    timings = run_stages(args.steps, objects, hashes)
+    total = time.perf_counter() - start
+    print('%-10s %10.3fs' % ('total', total))
+    if args.report:
+        report = {'file': bpy.data.filepath, 'tiles': len(objects), 'stages': [{'step': step, 'seconds': seconds} for step, seconds in timings], 'total': total}
+        with open(args.report, 'w') as file:
+            json.dump(report, file, indent=2)
+    if args.save:
+        bpy.ops.wm.save_mainfile()
+    #without --save the edits are lost, so the hashes must not claim them
+    if hashes is not None and (args.save or all(step in export_steps for step in args.steps)):
+        save_hashes(path, hashes)
+
+if __name__ == '__main__':
+    main()
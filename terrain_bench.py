@@ -0,0 +1,193 @@
+# Times the terrain tile steps on a generated world and compares them against a stored baseline
+# blender --background --factory-startup --python-exit-code 1 --python terrain_bench.py -- --tiles 64 --resolution 64 --baseline bench_baseline.json
+# Add --write-baseline to store the current timings as the new baseline
+
+import bpy
+import sys
+import os
+import time
+import json
+import platform
+import argparse
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import terrain_tiles_beta as terrain
+import terrain_batch
+
+def tile_position(name):
+    return terrain.tiles.cell(name)
+def synthetic_heights(x, y):
+    #continuous across tiles since it only depends on world position
+    return (np.sin(x * 0.05) * np.cos(y * 0.04) * 6.0 + np.sin(x * 0.31 + y * 0.17) * 1.5).astype(np.float32)
+def make_tile(name, col, row, resolution, size, collection):
+    xs = np.linspace(-size * 0.5, size * 0.5, resolution, dtype=np.float32)
+    xx, yy = np.meshgrid(xs, xs)
+    cx = (col + 0.5) * size
+    cy = (row + 0.5) * size
+    co = np.stack((xx + cx, yy + cy, synthetic_heights(xx + cx, yy + cy)), axis=-1).reshape(-1, 3)
+    index = np.arange(resolution * resolution).reshape(resolution, resolution)
+    quads = np.stack((index[:-1, :-1], index[:-1, 1:], index[1:, 1:], index[1:, :-1]), axis=-1).reshape(-1, 4)
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(co.tolist(), [], quads.tolist())
+    mesh.update()
+    object = bpy.data.objects.new(name, mesh)
+    collection.objects.link(object)
+    group = object.vertex_groups.new(name='paint')
+    group.add(list(range(len(co))), 0.0, 'REPLACE')
+    object.vertex_groups.active_index = group.index
+    return object
+def make_bake_material(resolution):
+    #EMIT bake of the active group into a 'Col' image, what ExportColTexLoop expects
+    mat = bpy.data.materials.new('bench_col')
+    mat.use_nodes = True
+    nodes = mat.node_tree.nodes
+    links = mat.node_tree.links
+    nodes.clear()
+    attribute = nodes.new('ShaderNodeAttribute')
+    attribute.attribute_name = 'paint'
+    emission = nodes.new('ShaderNodeEmission')
+    output = nodes.new('ShaderNodeOutputMaterial')
+    image = nodes.new('ShaderNodeTexImage')
+    image.name = 'Col'
+    image.image = bpy.data.images.new('bench_col', resolution, resolution)
+    nodes.active = image
+    links.new(attribute.outputs['Fac'], emission.inputs['Strength'])
+    links.new(emission.outputs['Emission'], output.inputs['Surface'])
+    return mat
+def make_world(count, resolution, size=100.0, bake=True):
+    bpy.ops.wm.read_homefile(use_empty=True)
+    collection = bpy.context.scene.collection
+    mat = make_bake_material(resolution) if bake else None
+    objects = []
+    for name in terrain.tile_names()[:count]:
+        col, row = tile_position(name)
+        object = make_tile(name, col, row, resolution, size, collection)
+        if mat is not None:
+            object.data.materials.append(mat)
+        objects.append(object)
+    bpy.context.scene.render.engine = 'CYCLES'
+    bpy.context.scene.cycles.samples = 1
+    return objects
+
+def bench_relations():
+    objects = [obj for obj in bpy.context.selected_objects]
+    grid = terrain.TileGrid(objects)
+    for object in objects:
+        terrain.get_object_relations(objects, object, grid)
+def bench_border_separate():
+    for object in [obj for obj in bpy.context.selected_objects]:
+        terrain.get_border_verts_separate(object)
+def bench_export(directory):
+    def export():
+        terrain.ExportColTexSelected(directory)
+    return export
+def bench_raster(directory):
+    def raster():
+        terrain.ExportWeightTexSelected(directory)
+    return raster
+def bench_stages(directory):
+    #name -> step run over the selected tiles, same order the pipeline uses
+    return [
+        ('relations', bench_relations),
+        ('border_separate', bench_border_separate),
+        ('borders', terrain.get_border_verts_every),
+        ('slopes', terrain.slope_all_objects),
+        ('erode', terrain.erode_all_objects),
+        ('random', terrain.random_vertex_group_all_objects),
+        ('bleed', terrain.bleed_vertex_group_all_objects),
+        ('seams', terrain.bleed_seams_all_objects),
+        ('origin', terrain.origin_to_geo_grid),
+        ('export', bench_export(directory)),
+        ('raster', bench_raster(directory)),
+    ]
+def run(objects, stages, repeat=1, warm=False):
+    #best of repeat runs per stage, caches are dropped before each run unless warm
+    results = {}
+    for name, function in stages:
+        best = None
+        error = None
+        for n in range(repeat):
+            if not warm:
+                terrain.invalidate_mesh_cache()
+                terrain.invalidate_bounding_box_cache()
+            terrain_batch.select_tiles(objects)
+            start = time.perf_counter()
+            try:
+                function()
+            except Exception as e:
+                error = str(e)
+                break
+            seconds = time.perf_counter() - start
+            best = seconds if best is None else min(best, seconds)
+        results[name] = {'seconds': best, 'error': error}
+        if error is None:
+            print('%-16s %10.3fs' % (name, best))
+        else:
+            print('%-16s failed: %s' % (name, error))
+    return results
+def compare(results, baseline, threshold=0.25, noise=0.05):
+    #a stage regresses when it is slower than baseline * (1 + threshold) and by more than noise seconds
+    regressions = []
+    for name, base in baseline.get('stages', {}).items():
+        current = results.get(name)
+        if current is None or base.get('seconds') is None:
+            continue
+        if current['seconds'] is None:
+            regressions.append((name, base['seconds'], None))
+            continue
+        limit = base['seconds'] * (1.0 + threshold)
+        if current['seconds'] > limit and current['seconds'] - base['seconds'] > noise:
+            regressions.append((name, base['seconds'], current['seconds']))
+    return regressions
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(prog='terrain_bench.py', description='benchmark the terrain tile steps')
+    parser.add_argument('--tiles', type=int, default=16, help='number of tiles, A0A0 onwards (max 400)')
+    parser.add_argument('--resolution', type=int, default=64, help='vertices per tile side')
+    parser.add_argument('--size', type=float, default=100.0, help='tile size in world units')
+    parser.add_argument('--stages', default='', help='comma separated subset of the stages')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--warm', action='store_true', help='keep mesh caches between runs')
+    parser.add_argument('--out', default='bench_output.json')
+    parser.add_argument('--export-dir', default='')
+    parser.add_argument('--baseline', default='')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown, 0.25 = 25%%')
+    parser.add_argument('--write-baseline', action='store_true')
+    args = parser.parse_args(argv)
+    directory = args.export_dir or os.path.join(os.path.dirname(os.path.abspath(args.out)), 'bench_textures')
+    os.makedirs(directory, exist_ok=True)
+    stages = bench_stages(directory)
+    if args.stages:
+        wanted = args.stages.split(',')
+        stages = [stage for stage in stages if stage[0] in wanted]
+    start = time.perf_counter()
+    objects = make_world(args.tiles, args.resolution, args.size, any(stage[0] == 'export' for stage in stages))
+    print('generated %d tiles of %dx%d in %.3fs' % (len(objects), args.resolution, args.resolution, time.perf_counter() - start))
+    results = run(objects, stages, args.repeat, args.warm)
+    report = {'tiles': len(objects), 'resolution': args.resolution, 'blender': bpy.app.version_string, 'python': platform.python_version(), 'machine': platform.node(), 'stages': results}
+    with open(args.out, 'w') as file:
+        json.dump(report, file, indent=2)
+    if args.baseline and args.write_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+        print('baseline written to ' + args.baseline)
+        return 0
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get('tiles') != report['tiles'] or baseline.get('resolution') != report['resolution']:
+            print('baseline was taken with %s tiles at %s, not comparable' % (baseline.get('tiles'), baseline.get('resolution')))
+            return 1
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after in regressions:
+            print('REGRESSION %s: %.3fs -> %s' % (name, before, 'failed' if after is None else '%.3fs' % after))
+        if regressions:
+            return 1
+        print('no regressions against ' + args.baseline)
+    return 0
+
+if __name__ == '__main__':
+    code = main()
+    if code:
+        sys.exit(code)
@@ -0,0 +1,385 @@
+# Terrain tile data and weight algorithms without bpy, so they can be profiled and run in plain python workers
+# A tile is a regular grid: heights[row, col], row follows +y (forward -> backward), col follows +x (left -> right)
+# terrain_tiles_beta.py has the adapters that load/store tiles from/to Blender meshes
+
+import zlib
+import hashlib
+import struct
+import numpy as np
+
+#same order as get_object_relations / TileGrid in terrain_tiles_beta.py
+sides = ['left', 'right', 'forward', 'backward']
+opposite = [1, 0, 3, 2]
+side_offsets = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+class Tile:
+    def __init__(self, name, heights, coord=(0, 0), x=None, y=None, layers=None):
+        self.name = name
+        self.heights = np.asarray(heights, dtype=np.float32)
+        rows, cols = self.heights.shape
+        self.coord = tuple(coord)
+        #local vertex positions along each axis
+        self.x = np.arange(cols, dtype=np.float32) if x is None else np.asarray(x, dtype=np.float32)
+        self.y = np.arange(rows, dtype=np.float32) if y is None else np.asarray(y, dtype=np.float32)
+        self.layers = {}
+        for layer_name, values in (layers or {}).items():
+            self.set_layer(layer_name, values)
+        #mesh vertex index of every grid cell, filled in by the Blender adapter
+        self.order = None
+    @property
+    def shape(self):
+        return self.heights.shape
+    def layer(self, name, default=0.0):
+        values = self.layers.get(name)
+        if values is None:
+            values = np.full(self.shape, default, dtype=np.float32)
+            self.layers[name] = values
+        return values
+    def set_layer(self, name, values):
+        values = np.asarray(values, dtype=np.float32).reshape(self.shape)
+        self.layers[name] = values
+        return values
+    def coordinates(self):
+        #(rows, cols, 2) local xy of every vertex
+        xx, yy = np.meshgrid(self.x, self.y)
+        return np.stack((xx, yy), axis=-1)
+    def bounds(self):
+        return (float(self.x.min()), float(self.x.max()), float(self.y.min()), float(self.y.max()))
+
+def tiles_by_coord(tiles):
+    return {tile.coord: tile for tile in tiles}
+def neighbor(tiles, tile, side):
+    #tiles is a {coord: Tile} dict, None for holes and the world edge
+    offset = side_offsets[side]
+    return tiles.get((tile.coord[0] + offset[0], tile.coord[1] + offset[1]))
+
+def oriented(array, side):
+    #view of a grid turned so the given side is the last column and [:, ::-1] walks inwards
+    if side == 0:
+        return array[:, ::-1]
+    if side == 1:
+        return array
+    if side == 2:
+        return array[::-1, :].T
+    return array.T
+def border(array, side):
+    return oriented(array, side)[:, -1]
+
+def circle_falloff_weights(co, centers, radius=25.0, strength=0.1, chunk=1 << 20):
+    #summed linear falloff of every circle, (circles x verts) at a time, chunk bounds the array size
+    co = np.asarray(co, dtype=np.float32).reshape(-1, np.shape(co)[-1])[:, :2]
+    centers = np.asarray(centers, dtype=np.float32).reshape(-1, 2)
+    weights = np.zeros(len(co), dtype=np.float32)
+    if len(centers) == 0:
+        return weights
+    step = max(1, chunk // len(centers))
+    for start in range(0, len(co), step):
+        part = co[start:start + step]
+        dx = part[None, :, 0] - centers[:, 0, None]
+        dy = part[None, :, 1] - centers[:, 1, None]
+        dist = np.sqrt(dx * dx + dy * dy)
+        falloff = np.clip(radius - dist, 0.0, None) * (strength / radius)
+        weights[start:start + step] = falloff.sum(axis=0)
+    return weights
+def graph_distance(indptr, indices, sources, limit=None):
+    #edge steps from the nearest source over csr adjacency, one multi source bfs, -1 where not reached
+    #each level gathers the neighbors of the whole frontier at once, every vertex enters it once
+    count = len(indptr) - 1
+    distance = np.full(count, -1, dtype=np.int32)
+    frontier = np.unique(np.asarray(sources, dtype=np.int64))
+    distance[frontier] = 0
+    level = 0
+    while len(frontier) > 0 and (limit is None or level < limit):
+        level += 1
+        starts = indptr[frontier]
+        lengths = indptr[frontier + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(int(lengths.sum()))
+        found = np.unique(indices[offsets])
+        frontier = found[distance[found] < 0]
+        distance[frontier] = level
+    return distance
+#t (0..1 along the falloff) -> 0..1 share of the way from start to end
+falloff_curves = {
+    'linear': lambda t: t,
+    'smooth': lambda t: t * t * (3.0 - 2.0 * t),
+    'sharp': lambda t: 1.0 - (1.0 - t) * (1.0 - t),
+    'root': np.sqrt,
+    'sphere': lambda t: 1.0 - np.sqrt(np.clip(1.0 - t * t, 0.0, 1.0)),
+    'constant': np.zeros_like,
+}
+def distance_falloff(distance, count=100, curve='linear', start=1.0, end=0.0):
+    #weights for distances 0..count-1, the border loop already takes one step like get_left_edgeloops
+    #curve is a falloff_curves name or any callable on a 0..1 array
+    if not callable(curve):
+        curve = falloff_curves[curve]
+    t = np.clip((np.asarray(distance, dtype=np.float32) + 1.0) / count, 0.0, 1.0)
+    return (start + (end - start) * curve(t)).astype(np.float32)
+
+def bleed_seam(values, target, rng=None, falloff=0.015):
+    #values is an oriented view (seam = last column), target the weights the seam should take
+    #every row gets a random trail that lerps from the target back into the tile
+    #trails stay off the first/last row and the first column, those belong to the other seams,
+    #so bleeding one seam never unwelds another
+    if rng is None:
+        rng = np.random.default_rng()
+    rows, cols = values.shape
+    target = np.asarray(target, dtype=np.float32)
+    body = values[1:-1]
+    inside = target[1:-1]
+    diff = 1.0 - np.abs(inside - body[:, -1])
+    random_length = rng.random(len(body))
+    trail_length = random_length + (0.5 - random_length) * 0.8
+    step = (1.0 / trail_length) * falloff * diff
+    #only as deep as the longest trail reaches, so the cost follows the border length
+    depth = max(cols - 2, 0)
+    if len(body) > 0 and step.min() > 0.0:
+        depth = min(depth, int(np.ceil(1.0 / step.min())))
+    if depth > 0:
+        amount = np.clip(1.0 - step[:, None] * np.arange(1, depth + 1, dtype=np.float32)[None, :], 0.0, 1.0)
+        trail = body[:, -2:-2 - depth:-1]
+        trail += (inside[:, None] - trail) * amount
+    values[:, -1] = target
+    return values
+
+def seam_rng(seed, coord, side):
+    #one stream per seam so a seam bleeds the same whatever else is processed
+    return np.random.default_rng([seed & 0xffffffff, coord[0] & 0xffffffff, coord[1] & 0xffffffff, side])
+def grid_seams(tiles, seams=None):
+    #every shared edge once, as (tile, side, other) with side right or backward
+    #seams limits it to a set of (coord, side) pairs, either tile's view of the seam works
+    found = []
+    for coord in sorted(tiles):
+        tile = tiles[coord]
+        for side in (1, 3):
+            other = neighbor(tiles, tile, side)
+            if other is None:
+                continue
+            if seams is not None and (coord, side) not in seams and (other.coord, opposite[side]) not in seams:
+                continue
+            found.append((tile, side, other))
+    return found
+def corner_points(tile):
+    #world grid point of each corner value: (row, col) index in the tile -> point
+    cx, cy = tile.coord
+    rows, cols = tile.shape
+    return [((0, 0), (cx, cy)), ((0, cols - 1), (cx + 1, cy)), ((rows - 1, 0), (cx, cy + 1)), ((rows - 1, cols - 1), (cx + 1, cy + 1))]
+def corner_means(tiles, layer, points=None):
+    #mean of all tiles meeting at each corner point
+    totals = {}
+    for tile in tiles.values():
+        values = tile.layer(layer)
+        for index, point in corner_points(tile):
+            if points is not None and point not in points:
+                continue
+            total = totals.setdefault(point, [0.0, 0])
+            total[0] += float(values[index])
+            total[1] += 1
+    return {point: total[0] / total[1] for point, total in totals.items()}
+def seam_points(tile, side):
+    #the two corner points at the ends of a tile's side
+    rows, cols = tile.shape
+    on_side = [lambda index: index[1] == 0, lambda index: index[1] == cols - 1, lambda index: index[0] == 0, lambda index: index[0] == rows - 1][side]
+    return [point for index, point in corner_points(tile) if on_side(index)]
+def weld_seams(tiles, layer, found):
+    #both sides of each seam get their mean, then the corners at the seams' ends the mean of their tiles
+    #other corners are left alone, their tiles may not all be loaded
+    points = set()
+    for tile, side, other in found:
+        a = border(tile.layer(layer), side)
+        b = border(other.layer(layer), opposite[side])
+        mean = (a + b) * 0.5
+        a[:] = mean
+        b[:] = mean
+        points.update(seam_points(tile, side))
+    means = corner_means(tiles, layer, points)
+    for tile in tiles.values():
+        values = tile.layer(layer)
+        for index, point in corner_points(tile):
+            if point in means:
+                values[index] = means[point]
+def bleed_seams(tiles, layer, seed=0, falloff=0.015, seams=None):
+    #all four seams of every tile in one pass: both sides of a seam trail towards the seam's mean,
+    #corners towards the mean of the tiles meeting there, then the seams are welded so they match exactly
+    found = [(tile, side, other) for tile, side, other in grid_seams(tiles, seams) if tile.shape[side // 2] == other.shape[side // 2]]
+    corners = corner_means(tiles, layer)
+    targets = []
+    for tile, side, other in found:
+        target = (border(tile.layer(layer), side) + border(other.layer(layer), opposite[side])) * 0.5
+        #first and last entry of a seam are corners
+        points = dict((index, point) for index, point in corner_points(tile))
+        ends = [(0, -1), (-1, -1)] if side == 1 else [(-1, 0), (-1, -1)]
+        rows, cols = tile.shape
+        for n, end in zip((0, -1), ends):
+            index = (end[0] % rows, end[1] % cols)
+            target[n] = corners[points[index]]
+        targets.append((tile, side, other, target))
+    for tile, side, other, target in targets:
+        rng = seam_rng(seed, tile.coord, side)
+        bleed_seam(oriented(tile.layer(layer), side), target, rng, falloff)
+        bleed_seam(oriented(other.layer(layer), opposite[side]), target, rng, falloff)
+    weld_seams(tiles, layer, found)
+    return len(found)
+
+class World:
+    #every tile stitched into one array per layer; tile heights/layers become views into it
+    #overlap is how many vertex rows neighboring tiles share (1 when border vertices coincide)
+    def __init__(self, tiles, overlap=1):
+        tiles = list(tiles.values()) if isinstance(tiles, dict) else list(tiles)
+        self.tiles = tiles_by_coord(tiles)
+        self.overlap = overlap
+        self.rows, self.cols = tiles[0].shape if tiles else (0, 0)
+        for tile in tiles:
+            if tile.shape != (self.rows, self.cols):
+                raise ValueError('tile ' + tile.name + ' has a different resolution')
+        self.stride = (self.rows - overlap, self.cols - overlap)
+        coords = np.array(list(self.tiles.keys()), dtype=np.int64).reshape(-1, 2)
+        self.origin = tuple(int(v) for v in coords.min(axis=0)) if len(coords) else (0, 0)
+        extent = tuple(int(v) for v in coords.max(axis=0) - coords.min(axis=0) + 1) if len(coords) else (0, 0)
+        self.shape = (extent[1] * self.stride[0] + overlap, extent[0] * self.stride[1] + overlap)
+        #cells no tile covers (holes) stay NaN in the height map
+        self.heights = self.gather([tile.heights for tile in tiles], np.nan)
+        self.layers = {}
+        for tile in tiles:
+            tile.heights = self.view(self.heights, tile.coord)
+        for name in sorted(set(name for tile in tiles for name in tile.layers)):
+            self.layer(name)
+    def slices(self, coord):
+        r = (coord[1] - self.origin[1]) * self.stride[0]
+        c = (coord[0] - self.origin[0]) * self.stride[1]
+        return slice(r, r + self.rows), slice(c, c + self.cols)
+    def view(self, array, coord):
+        return array[self.slices(coord)]
+    def gather(self, arrays, empty=0.0):
+        #shared cells get the mean of the tiles covering them, so stitched seams always agree
+        total = np.zeros(self.shape, dtype=np.float32)
+        count = np.zeros(self.shape, dtype=np.float32)
+        for tile, values in zip(self.tiles.values(), arrays):
+            if values is None:
+                continue
+            total[self.slices(tile.coord)] += values
+            count[self.slices(tile.coord)] += 1.0
+        return np.where(count > 0.0, total / np.maximum(count, 1.0), np.float32(empty)).astype(np.float32)
+    def layer(self, name, default=0.0):
+        #world array of a layer, created from the tiles' own layers the first time
+        values = self.layers.get(name)
+        if values is not None:
+            return values
+        values = self.gather([tile.layers.get(name) for tile in self.tiles.values()], default)
+        self.layers[name] = values
+        for tile in self.tiles.values():
+            tile.layers[name] = self.view(values, tile.coord)
+        return values
+    def set_layer(self, name, values):
+        values = np.asarray(values, dtype=np.float32).reshape(self.shape)
+        self.layers[name] = values
+        for tile in self.tiles.values():
+            tile.layers[name] = self.view(values, tile.coord)
+        return values
+    def spacing(self):
+        tile = next(iter(self.tiles.values()))
+        dx = float(tile.x[1] - tile.x[0]) if len(tile.x) > 1 else 1.0
+        dy = float(tile.y[1] - tile.y[0]) if len(tile.y) > 1 else 1.0
+        return dx, dy
+    def covered(self):
+        mask = np.zeros(self.shape, dtype=bool)
+        for coord in self.tiles:
+            mask[self.slices(coord)] = True
+        return mask
+
+def vertex_normals(heights, dx=1.0, dy=1.0):
+    #(rows, cols, 3) normals of a height grid, summed from the quads around each vertex like face normals
+    #NaN heights (holes in a world) contribute no faces
+    h = np.asarray(heights, dtype=np.float32)
+    rows, cols = h.shape
+    normals = np.zeros((rows, cols, 3), dtype=np.float32)
+    if rows < 2 or cols < 2:
+        normals[..., 2] = 1.0
+        return normals
+    #diagonals of each quad: (r, c) -> (r+1, c+1) and (r, c+1) -> (r+1, c)
+    a = h[1:, 1:] - h[:-1, :-1]
+    b = h[1:, :-1] - h[:-1, 1:]
+    face = np.stack((dy * (b - a), -dx * (a + b), np.full(a.shape, 2.0 * dx * dy, dtype=np.float32)), axis=-1)
+    face[np.isnan(face).any(axis=-1)] = 0.0
+    normals[:-1, :-1] += face
+    normals[:-1, 1:] += face
+    normals[1:, :-1] += face
+    normals[1:, 1:] += face
+    length = np.linalg.norm(normals, axis=-1, keepdims=True)
+    normals = np.divide(normals, length, out=np.zeros_like(normals), where=length > 0.0)
+    normals[length[..., 0] == 0.0] = (0.0, 0.0, 1.0)
+    return normals
+def slope_map(heights, dx=1.0, dy=1.0):
+    #0 on flat ground, 1 on a vertical wall: 1 - normal z, what ant_slope_map writes by default
+    return np.clip(1.0 - vertex_normals(heights, dx, dy)[..., 2], 0.0, 1.0).astype(np.float32)
+
+def grid_layout(xy, error=0.01):
+    #indices of scattered grid points laid out as (rows, cols): rows along +y, cols along +x
+    #error is how far a point may sit off its row, in the units of xy
+    xy = np.asarray(xy, dtype=np.float64)
+    count = len(xy)
+    if count == 0:
+        raise ValueError('empty grid')
+    lo = xy[:, 1].min()
+    cols = int(np.count_nonzero(np.abs(xy[:, 1] - lo) <= error))
+    if cols == 0 or count % cols != 0:
+        raise ValueError('not a regular grid')
+    rows = count // cols
+    height = xy[:, 1].max() - lo
+    row = np.zeros(count, dtype=np.int64)
+    if rows > 1 and height > 0.0:
+        row = np.rint((xy[:, 1] - lo) * ((rows - 1) / height)).astype(np.int64)
+    if np.any(np.bincount(row, minlength=rows) != cols):
+        raise ValueError('not a regular grid')
+    return np.lexsort((xy[:, 0], row)).reshape(rows, cols)
+def resample(grid, width, height=None):
+    #bilinear image of a vertex grid, the first/last vertices sit on the image edges like uvs 0 and 1
+    #image row 0 is the grid's first row (-y), the same bottom-up order Blender images use
+    if height is None:
+        height = width
+    grid = np.asarray(grid, dtype=np.float32)
+    rows, cols = grid.shape[:2]
+    gy = ((np.arange(height, dtype=np.float32) + 0.5) / height) * (rows - 1)
+    gx = ((np.arange(width, dtype=np.float32) + 0.5) / width) * (cols - 1)
+    y0 = np.clip(np.floor(gy).astype(np.int64), 0, max(rows - 2, 0))
+    x0 = np.clip(np.floor(gx).astype(np.int64), 0, max(cols - 2, 0))
+    y1 = np.minimum(y0 + 1, rows - 1)
+    x1 = np.minimum(x0 + 1, cols - 1)
+    fy = (gy - y0)[:, None]
+    fx = (gx - x0)[None, :]
+    if grid.ndim == 3:
+        fy = fy[..., None]
+        fx = fx[..., None]
+    top = grid[y0][:, x0] * (1.0 - fx) + grid[y0][:, x1] * fx
+    bottom = grid[y1][:, x0] * (1.0 - fx) + grid[y1][:, x1] * fx
+    return (top * (1.0 - fy) + bottom * fy).astype(np.float32)
+def png_chunk(kind, data):
+    chunk = kind + data
+    return struct.pack('>I', len(data)) + chunk + struct.pack('>I', zlib.crc32(chunk) & 0xffffffff)
+def write_png(path, image, bit_depth=8):
+    #image is 0..1 floats, (h, w) grey or (h, w, 1-4) channels, bottom-up rows; 8 or 16 bit
+    image = np.asarray(image, dtype=np.float32)
+    if image.ndim == 2:
+        image = image[..., None]
+    height, width, channels = image.shape
+    color_type = {1: 0, 2: 4, 3: 2, 4: 6}[channels]
+    top = 255 if bit_depth == 8 else 65535
+    pixels = np.rint(np.clip(np.nan_to_num(image[::-1]), 0.0, 1.0) * top).astype('>u2' if bit_depth == 16 else np.uint8)
+    raw = np.zeros((height, 1 + width * channels * (bit_depth // 8)), dtype=np.uint8)
+    raw[:, 1:] = np.ascontiguousarray(pixels).reshape(height, -1).view(np.uint8)
+    header = struct.pack('>IIBBBBB', width, height, bit_depth, color_type, 0, 0, 0)
+    with open(path, 'wb') as file:
+        file.write(b'\x89PNG\r\n\x1a\n')
+        file.write(png_chunk(b'IHDR', header))
+        file.write(png_chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)))
+        file.write(png_chunk(b'IEND', b''))
+    return path
+
+def content_hash(arrays, params=None):
+    #blake2b over the raw buffers plus their shape/dtype and repr(params), hex string
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(repr((array.dtype.str, array.shape)).encode())
+        digest.update(array.tobytes())
+    digest.update(repr(params).encode())
+    return digest.hexdigest()
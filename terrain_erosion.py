@@ -0,0 +1,167 @@
+# Hydraulic/thermal erosion on height grids with NumPy, stands in for the ANT Landscape eroder operator
+# Produces the same maps calc_erosion_all_objects collects (erosion_layers), as 0..1 weights
+# No bpy in here so tiles can be eroded in a process pool, also when called from inside Blender
+
+import os
+import sys
+import glob
+import types
+import numpy as np
+import concurrent.futures
+import multiprocessing
+
+erosion_layers = ['rainmap', 'scree', 'avalanced', 'water', 'scour', 'deposit', 'flowrate', 'sediment', 'sedimentpct', 'capacity']
+#same defaults calc_erosion_all_objects passes to bpy.ops.mesh.eroder
+default_params = {'iterations': 1, 'iter_river': 30, 'iter_ava': 5, 'iter_diffuse': 5, 'kd': 0.1, 'kt': 1.0472, 'kr': 0.01, 'kv': 0.0, 'ks': 0.5, 'kdep': 0.1, 'kz': 0.3, 'kc': 0.9, 'ka': 1.0, 'kev': 0.5, 'pd': 0.2, 'pa': 0.5, 'pw': 1.0}
+
+def neighbor_views(array):
+    #left, right, forward, backward neighbor of every cell, edges repeat themselves
+    padded = np.pad(array, 1, mode='edge')
+    return [padded[1:-1, :-2], padded[1:-1, 2:], padded[:-2, 1:-1], padded[2:, 1:-1]]
+def shift_into(amounts, side):
+    #moves per-cell amounts sent towards side onto the receiving cells, what leaves the grid is dropped
+    moved = np.zeros_like(amounts)
+    if side == 0:
+        moved[:, :-1] = amounts[:, 1:]
+    elif side == 1:
+        moved[:, 1:] = amounts[:, :-1]
+    elif side == 2:
+        moved[:-1, :] = amounts[1:, :]
+    else:
+        moved[1:, :] = amounts[:-1, :]
+    return moved
+
+def diffuse(heights, kd, iterations, probability, rng):
+    #thermal smoothing, each pass only touches a random share (probability) of the cells
+    for n in range(iterations):
+        laplace = sum(neighbor_views(heights)) - 4.0 * heights
+        mask = rng.random(heights.shape) < probability
+        heights += np.where(mask, kd * 0.25 * laplace, 0.0)
+    return heights
+def avalanche(heights, talus, iterations, probability, rng):
+    #material above the talus slope slides to lower neighbors; returns (removed, deposited)
+    avalanced = np.zeros_like(heights)
+    scree = np.zeros_like(heights)
+    for n in range(iterations):
+        mask = rng.random(heights.shape) < probability
+        outs = []
+        for side, other in enumerate(neighbor_views(heights)):
+            excess = np.clip(heights - other - talus, 0.0, None)
+            outs.append(np.where(mask, excess * 0.125, 0.0))
+        for side, out in enumerate(outs):
+            heights -= out
+            avalanced += out
+            moved = shift_into(out, side)
+            heights += moved
+            scree += moved
+    return avalanced, scree
+def fluvial(heights, rain, params, rng):
+    #water runs to lower neighbors each iteration, carrying sediment up to its capacity
+    shape = heights.shape
+    water = np.zeros(shape, dtype=np.float32)
+    sediment = np.zeros(shape, dtype=np.float32)
+    flowrate = np.zeros(shape, dtype=np.float32)
+    scour = np.zeros(shape, dtype=np.float32)
+    deposit = np.zeros(shape, dtype=np.float32)
+    capacity = np.zeros(shape, dtype=np.float32)
+    evaporation = min(1.0, params['kev'] / max(1, params['iter_river']))
+    for n in range(params['iter_river']):
+        water += rain * (rng.random(shape) < params['pw'])
+        surface = heights + water
+        drops = [np.clip(surface - other, 0.0, None) for other in neighbor_views(surface)]
+        total = sum(drops)
+        #half the height difference evens two cells out, never more water than the cell has
+        out = np.minimum(water, total * 0.5)
+        fractions = [np.divide(d, total, out=np.zeros(shape, dtype=np.float32), where=total > 0.0) for d in drops]
+        slope = np.max(drops, axis=0)
+        capacity = params['kc'] * out * np.power(slope, params['ka'])
+        pick = np.minimum(params['ks'] * np.clip(capacity - sediment, 0.0, None), params['kz'])
+        drop = params['kdep'] * np.clip(sediment - capacity, 0.0, None)
+        heights -= pick
+        heights += drop
+        scour += pick
+        deposit += drop
+        sediment += pick - drop
+        carried = np.divide(sediment * out, water, out=np.zeros(shape, dtype=np.float32), where=water > 0.0)
+        water -= out
+        sediment -= carried
+        for side, fraction in enumerate(fractions):
+            water += shift_into(out * fraction, side)
+            sediment += shift_into(carried * fraction, side)
+        flowrate += out
+        water *= 1.0 - evaporation
+    sedimentpct = np.divide(sediment, capacity, out=np.zeros(shape, dtype=np.float32), where=capacity > 0.0)
+    return {'water': water, 'sediment': sediment, 'flowrate': flowrate, 'scour': scour, 'deposit': deposit, 'capacity': capacity, 'sedimentpct': np.clip(sedimentpct, 0.0, 1.0)}
+def normalized(values):
+    values = np.nan_to_num(np.asarray(values, dtype=np.float32))
+    top = float(values.max()) if values.size else 0.0
+    low = float(values.min()) if values.size else 0.0
+    if top - low <= 0.0:
+        return np.zeros_like(values)
+    return (values - low) / (top - low)
+
+def erode(heights, spacing=1.0, rainmap=None, seed=None, **params):
+    #returns (eroded heights, {layer: 0..1 weights}); heights is not modified
+    p = dict(default_params)
+    p.update(params)
+    rng = np.random.default_rng(seed)
+    heights = np.array(heights, dtype=np.float32)
+    if rainmap is None or not np.any(rainmap):
+        rainmap = np.ones(heights.shape, dtype=np.float32)
+    rainmap = np.asarray(rainmap, dtype=np.float32)
+    rain = p['kr'] * rainmap * (1.0 + p['kv'] * (rng.random(heights.shape) - 0.5))
+    talus = np.tan(p['kt']) * spacing
+    totals = {name: np.zeros(heights.shape, dtype=np.float32) for name in erosion_layers}
+    for n in range(p['iterations']):
+        diffuse(heights, p['kd'], p['iter_diffuse'], p['pd'], rng)
+        avalanced, scree = avalanche(heights, talus, p['iter_ava'], p['pa'], rng)
+        totals['avalanced'] += avalanced
+        totals['scree'] += scree
+        for name, values in fluvial(heights, rain, p, rng).items():
+            if name in ('water', 'sediment', 'capacity', 'sedimentpct'):
+                totals[name] = values
+            else:
+                totals[name] += values
+    totals['rainmap'] = np.clip(rainmap, 0.0, 1.0)
+    layers = {name: (totals[name] if name in ('rainmap', 'sedimentpct') else normalized(totals[name])) for name in erosion_layers}
+    return heights, layers
+def erode_arrays(heights, spacing, rainmap, seed, params):
+    #picklable entry point for the process pool
+    return erode(heights, spacing, rainmap, seed, **params)
+def tile_spacing(tile):
+    return float(tile.x[1] - tile.x[0]) if len(tile.x) > 1 else 1.0
+def worker_python():
+    #inside Blender sys.executable may be the blender binary, the workers need its bundled python
+    if not os.path.basename(sys.executable).lower().startswith('blender'):
+        return sys.executable
+    found = sorted(glob.glob(os.path.join(sys.prefix, 'bin', 'python3*')))
+    if len(found) == 0:
+        raise RuntimeError('no python found next to ' + sys.prefix + ', run erode_tiles with processes=0')
+    return found[0]
+def worker_context():
+    context = multiprocessing.get_context('spawn')
+    context.set_executable(worker_python())
+    return context
+class bpy_free_main:
+    #spawn re-imports the parent's __main__ in every worker; inside Blender that is the running script,
+    #which imports bpy. The workers only need this module, so __main__ is swapped for an empty one meanwhile
+    def __enter__(self):
+        self.main = sys.modules.get('__main__')
+        sys.modules['__main__'] = types.ModuleType('__main__')
+    def __exit__(self, *args):
+        sys.modules['__main__'] = self.main
+def erode_tiles(tiles, processes=0, seed=0, keep_heights=False, **params):
+    #erodes every tile, in a process pool when processes > 0, and stores the maps as tile layers
+    tiles = list(tiles)
+    jobs = [(tile.heights, tile_spacing(tile), tile.layers.get('rainmap'), [seed & 0xffffffff, tile.coord[0] & 0xffffffff, tile.coord[1] & 0xffffffff], params) for tile in tiles]
+    if processes > 0 and len(tiles) > 1:
+        with bpy_free_main(), concurrent.futures.ProcessPoolExecutor(max_workers=processes, mp_context=worker_context()) as pool:
+            results = list(pool.map(erode_arrays, *zip(*jobs)))
+    else:
+        results = [erode_arrays(*job) for job in jobs]
+    for tile, (heights, layers) in zip(tiles, results):
+        for name, values in layers.items():
+            tile.set_layer(name, values)
+        if keep_heights:
+            tile.heights = heights
+    return tiles
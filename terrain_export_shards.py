@@ -0,0 +1,162 @@
+# Splits the tile range into shards and bakes/saves them with several headless Blender processes at once
+# Scheduler (plain python):
+#   python terrain_export_shards.py world.blend --blender /opt/blender/blender --workers 32 --out /tmp/tex
+# Each worker runs this same file inside Blender:
+#   blender --background world.blend --python terrain_export_shards.py -- --worker --tiles A0A0,A0A1 --out /tmp/tex --results shard.json
+
+import sys
+import os
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+
+script_path = os.path.abspath(__file__)
+sys.path.append(os.path.dirname(script_path))
+
+import terrain_registry as registry
+def next_name(input):
+    return registry.default.next(input)
+def tile_range(first='A0A0', last='J9B1'):
+    return registry.default.range(first, last)
+def make_shards(names, count):
+    #contiguous slices so every worker touches neighbouring tiles
+    count = max(1, min(count, len(names)))
+    size, extra = divmod(len(names), count)
+    shards = []
+    start = 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        shards.append(names[start:end])
+        start = end
+    return [shard for shard in shards if shard]
+def worker_command(blender, blend, shard, out, results, threads=0, method='bake', resolution=256):
+    command = [blender, '--background', blend]
+    if threads > 0:
+        command += ['--threads', str(threads)]
+    command += ['--python', script_path, '--', '--worker', '--tiles', ','.join(shard), '--out', out, '--results', results, '--method', method, '--resolution', str(resolution)]
+    return command
+def read_results(path, shard):
+    #tiles the worker never reported (crash, timeout) count as failed
+    done = {}
+    failed = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            data = json.load(file)
+        done = data.get('done', {})
+        failed = data.get('failed', {})
+    for name in shard:
+        if name not in done and name not in failed:
+            failed[name] = 'no result from worker'
+    return done, failed
+def run_round(blender, blend, names, out, workers, threads, timeout, logdir, method='bake', resolution=256):
+    shards = make_shards(names, workers)
+    #every worker gets its share of the cores, blender would otherwise start one thread per core in each
+    if threads <= 0:
+        threads = max(1, (os.cpu_count() or 1) // len(shards))
+    processes = []
+    for i, shard in enumerate(shards):
+        results = os.path.join(logdir, 'shard_%03d.json' % i)
+        if os.path.exists(results):
+            os.remove(results)
+        log = open(os.path.join(logdir, 'shard_%03d.log' % i), 'w')
+        process = subprocess.Popen(worker_command(blender, blend, shard, out, results, threads, method, resolution), stdout=log, stderr=subprocess.STDOUT)
+        processes.append((process, log, shard, results))
+    done = {}
+    failed = {}
+    deadline = None if timeout <= 0 else time.time() + timeout
+    for process, log, shard, results in processes:
+        try:
+            process.wait(None if deadline is None else max(1.0, deadline - time.time()))
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        log.close()
+        shard_done, shard_failed = read_results(results, shard)
+        done.update(shard_done)
+        failed.update(shard_failed)
+    return done, failed
+def schedule(blend, blender, out, names, workers=4, retries=2, threads=0, timeout=0, logdir=None, method='bake', resolution=256):
+    #returns (done {tile: file}, failed {tile: error}) after the retry rounds
+    if logdir is None:
+        logdir = tempfile.mkdtemp(prefix='terrain_shards_')
+    os.makedirs(out, exist_ok=True)
+    done = {}
+    failed = {}
+    pending = list(names)
+    for attempt in range(retries + 1):
+        if len(pending) == 0:
+            break
+        start = time.time()
+        round_dir = os.path.join(logdir, 'round_%d' % attempt)
+        os.makedirs(round_dir, exist_ok=True)
+        round_done, failed = run_round(blender, blend, pending, out, workers, threads, timeout, round_dir, method, resolution)
+        done.update(round_done)
+        print('round %d: %d done, %d failed in %.1fs' % (attempt, len(round_done), len(failed), time.time() - start))
+        pending = [name for name in pending if name in failed]
+    return done, failed
+
+def worker(args):
+    import bpy
+    import terrain_tiles_beta as terrain
+    done = {}
+    failed = {}
+    def write():
+        with open(args.results, 'w') as file:
+            json.dump({'done': done, 'failed': failed}, file, indent=2)
+    for name in args.tiles.split(','):
+        object = bpy.data.objects.get(name)
+        if object is None:
+            failed[name] = 'no object named ' + name
+            write()
+            continue
+        try:
+            if args.method == 'splat':
+                done[name] = terrain.export_splat_maps(object, args.out, None, args.resolution)
+            elif args.method == 'raster':
+                done[name] = terrain.export_weight_tex(object, args.out, None, args.resolution)
+            else:
+                done[name] = terrain.export_col_tex(object, args.out)
+        except Exception as e:
+            failed[name] = str(e)
+        #written after every tile so a crash keeps what finished
+        write()
+    write()
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else sys.argv[1:]
+    parser = argparse.ArgumentParser(prog='terrain_export_shards.py', description='bake and save tile textures with several Blender processes')
+    parser.add_argument('blend', nargs='?', default='', help='.blend holding the tiles')
+    parser.add_argument('--blender', default='blender', help='blender executable')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=0, help='render threads per worker, 0 splits the cores between the workers')
+    parser.add_argument('--retries', type=int, default=2)
+    parser.add_argument('--timeout', type=float, default=0, help='seconds per round, 0 waits forever')
+    parser.add_argument('--first', default='A0A0')
+    parser.add_argument('--last', default='J9B1')
+    parser.add_argument('--tiles', default='', help='comma separated tile names or first:last ranges instead of --first/--last')
+    parser.add_argument('--out', default='', help='texture directory')
+    parser.add_argument('--logdir', default=None)
+    parser.add_argument('--method', default='bake', choices=['bake', 'raster', 'splat'], help='cycles EMIT bake, direct weight rasterization or packed RGBA splat maps')
+    parser.add_argument('--resolution', type=int, default=256, help='image size for --method raster/splat')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--results', default='', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        worker(args)
+        return 0
+    if not args.blend or not args.out:
+        parser.error('a .blend and --out are required')
+    #--tiles takes names and registry ranges, e.g. A0A0,C0A0:C9B1
+    names = [name for spec in args.tiles.split(',') if spec for name in registry.default.select(spec)] or tile_range(args.first, args.last)
+    start = time.time()
+    done, failed = schedule(os.path.abspath(args.blend), args.blender, os.path.abspath(args.out), names, args.workers, args.retries, args.threads, args.timeout, args.logdir, args.method, args.resolution)
+    print('%d tiles exported, %d failed in %.1fs' % (len(done), len(failed), time.time() - start))
+    for name in sorted(failed):
+        print('  ' + name + ': ' + failed[name])
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    code = main()
+    if 'bpy' not in sys.modules:
+        sys.exit(code)
@@ -0,0 +1,152 @@
+# Live seam fix-up: tiles sculpted or painted in the session are re-bled against their neighbors only
+# Run inside Blender: import terrain_live; terrain_live.start('paint')   ... terrain_live.stop()
+# Neighbors come from the same TileGrid cells as bleed_seams_all_objects, so a seam bleeds the same either way
+# The grid is only rebuilt when an edited tile moved cells, so cost follows the edited tiles, not the world
+
+import bpy
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import terrain_tiles_beta as terrain
+import terrain_core as core
+
+settings = {'group_name': None, 'delay': 0.5, 'seed': 0, 'falloff': 0.015, 'borders': True}
+#tiles with updates since the last flush
+dirty = set()
+#tile name -> input hash right after this module wrote it, so our own updates are not picked up again
+written = {}
+#tile name -> hash of the coordinates, weight painting also reports geometry updates
+#a tile's first flush only records it, so border creases follow from the second edit on
+shapes = {}
+last_change = [0.0]
+#TileGrid over the scene's tiles, rebuilt when it no longer matches an edited tile
+grid_cache = [None]
+#modes where the mesh data lags behind what the artist sees
+busy_modes = ['EDIT', 'SCULPT']
+
+def on_depsgraph_update(scene, depsgraph):
+    for update in depsgraph.updates:
+        id = update.id
+        if not isinstance(id, bpy.types.Object) or id.type != 'MESH':
+            continue
+        name = id.original.name
+        if name not in terrain.tiles:
+            continue
+        if update.is_updated_geometry or update.is_updated_transform:
+            dirty.add(name)
+            last_change[0] = time.perf_counter()
+    if dirty and not bpy.app.timers.is_registered(flush):
+        bpy.app.timers.register(flush, first_interval=settings['delay'])
+def tile_hash(object, group_name):
+    return terrain.tile_input_hash(object, [group_name], (), ('live', settings['seed'], settings['falloff']))
+def alive(object):
+    try:
+        return object.name in bpy.data.objects
+    except ReferenceError:
+        return False
+def stale(grid, names):
+    #an edited tile that is new, moved to another cell, or a neighbor that was deleted
+    for name in names:
+        coord = grid.coords.get(name)
+        if coord is None or not alive(grid.get(*coord)):
+            return True
+        center = terrain.get_bounding_box_centers([bpy.data.objects[name]])[0]
+        if grid.cell(center) != coord:
+            return True
+        for neighbor in grid.relations(bpy.data.objects[name]):
+            if neighbor is not None and not alive(neighbor):
+                return True
+    return False
+def tile_grid(names):
+    grid = grid_cache[0]
+    if grid is None or stale(grid, names):
+        terrain.invalidate_bounding_box_cache()
+        grid = terrain.TileGrid([obj for obj in bpy.context.scene.objects if obj.type == 'MESH' and obj.name in terrain.tiles])
+        grid_cache[0] = grid
+    return grid
+def neighborhood(grid, names):
+    #edited tiles plus the 8 around each, diagonals are needed for the corner means
+    objects = {}
+    for name in names:
+        x, y = grid.coords[name]
+        for cell in [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]:
+            object = grid.get(*cell)
+            if object is not None:
+                objects[cell] = object
+    return objects
+def edited_seams(grid, names):
+    #(coord, side) of every seam of the edited tiles, core.grid_seams takes either tile's view
+    return set((grid.coords[name], side) for name in names for side in range(4))
+def group_for():
+    if settings['group_name'] is not None:
+        return settings['group_name']
+    active = bpy.context.view_layer.objects.active
+    if active is not None and active.vertex_groups.active is not None:
+        return active.vertex_groups.active.name
+    return None
+def fix_seams(names):
+    #returns how many seams were re-bled
+    group_name = group_for()
+    if group_name is None:
+        return 0
+    grid = tile_grid(names)
+    names = [name for name in names if name in grid.coords]
+    objects = neighborhood(grid, names)
+    tiles = dict((cell, terrain.tile_from_object(object, [group_name], cell)) for cell, object in objects.items())
+    before = dict((cell, core.content_hash([tile.layer(group_name)])) for cell, tile in tiles.items())
+    #bleed_seam keeps its trails off the other seams and only the edited seams' end corners are welded,
+    #so the ring of seams around the edited tiles stays matched
+    count = core.bleed_seams(tiles, group_name, settings['seed'], settings['falloff'], edited_seams(grid, names))
+    changed = dict((cell, tile) for cell, tile in tiles.items() if core.content_hash([tile.layer(group_name)]) != before[cell])
+    terrain.tiles_to_objects(changed, [group_name])
+    for cell in changed:
+        written[objects[cell].name] = tile_hash(objects[cell], group_name)
+    return count
+def flush():
+    #timer callback: waits until edits settle (returns seconds to wait again), None unregisters it
+    wait = settings['delay'] - (time.perf_counter() - last_change[0])
+    if wait > 0.0:
+        return wait
+    if bpy.context.mode.split('_')[0] in busy_modes:
+        return settings['delay']
+    changes = sorted(dirty)
+    dirty.clear()
+    group_name = group_for()
+    names = []
+    for name in changes:
+        object = bpy.data.objects.get(name)
+        if object is None:
+            continue
+        if group_name is not None and written.get(name) == tile_hash(object, group_name):
+            continue
+        shape = core.content_hash([terrain.vert_coordinates(object)], tuple(map(tuple, object.matrix_world)))
+        if shapes.get(name, shape) != shape:
+            terrain.invalidate_mesh_cache(object)
+            terrain.invalidate_bounding_box_cache()
+            if settings['borders']:
+                terrain.get_border_verts_all(object)
+        shapes[name] = shape
+        names.append(name)
+    if names:
+        start = time.perf_counter()
+        count = fix_seams(names)
+        print('terrain_live: %d seams of %d tiles in %.3fs' % (count, len(names), time.perf_counter() - start))
+    return None
+
+def start(group_name=None, delay=0.5, seed=0, falloff=0.015, borders=True):
+    stop()
+    settings.update({'group_name': group_name, 'delay': delay, 'seed': seed, 'falloff': falloff, 'borders': borders})
+    bpy.app.handlers.depsgraph_update_post.append(on_depsgraph_update)
+def stop():
+    #also drops handlers left over from an earlier import of this file
+    for handler in list(bpy.app.handlers.depsgraph_update_post):
+        if getattr(handler, '__name__', '') == 'on_depsgraph_update' and getattr(handler, '__module__', '') == __name__:
+            bpy.app.handlers.depsgraph_update_post.remove(handler)
+    if bpy.app.timers.is_registered(flush):
+        bpy.app.timers.unregister(flush)
+    dirty.clear()
+    written.clear()
+    shapes.clear()
+    grid_cache[0] = None
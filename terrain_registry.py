@@ -0,0 +1,117 @@
+# Tile names <-> grid coordinates without walking the NextName chain
+# 'A0B1' = column A, row 0, sub tile B (x) 1 (y); columns go A..Z, AA.., rows and sub rows are digits
+# No bpy in here so the shard scheduler can use it too
+
+import re
+import json
+
+name_pattern = re.compile(r'^([A-Z]+)(\d+)([A-Z])(\d+)$')
+
+def column_letters(index):
+    #0 -> A, 25 -> Z, 26 -> AA
+    letters = ''
+    index += 1
+    while index > 0:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(ord('A') + rest) + letters
+    return letters
+def column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+class TileRegistry:
+    #cols x rows blocks of sub_x x sub_y tiles, in the same order NextName walks them:
+    #sub y fastest, then sub x, then row, then column
+    def __init__(self, cols=10, rows=10, sub_x=2, sub_y=2):
+        if sub_x > 26:
+            raise ValueError('at most 26 sub columns')
+        self.cols = cols
+        self.rows = rows
+        self.sub_x = sub_x
+        self.sub_y = sub_y
+    def __len__(self):
+        return self.cols * self.rows * self.sub_x * self.sub_y
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.name(index)
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.name(index) for index in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        return self.name(item)
+    def __contains__(self, name):
+        return self.key(name) is not None
+    def key(self, name):
+        #(col, row, sub x, sub y), None when the name is not a tile of this grid
+        match = name_pattern.match(name)
+        if match is None:
+            return None
+        key = (column_index(match.group(1)), int(match.group(2)), ord(match.group(3)) - ord('A'), int(match.group(4)))
+        if key[0] >= self.cols or key[1] >= self.rows or key[2] >= self.sub_x or key[3] >= self.sub_y:
+            return None
+        return key
+    def name_of(self, col, row, sx=0, sy=0):
+        return column_letters(col) + str(row) + chr(ord('A') + sx) + str(sy)
+    def index(self, name):
+        key = self.key(name)
+        if key is None:
+            raise KeyError(name)
+        col, row, sx, sy = key
+        return ((col * self.rows + row) * self.sub_x + sx) * self.sub_y + sy
+    def name(self, index):
+        if index < 0 or index >= len(self):
+            raise IndexError(index)
+        index, sy = divmod(index, self.sub_y)
+        index, sx = divmod(index, self.sub_x)
+        col, row = divmod(index, self.rows)
+        return self.name_of(col, row, sx, sy)
+    def cell(self, name):
+        #tile position on the full grid, x along columns, y along rows
+        col, row, sx, sy = self.key(name)
+        return col * self.sub_x + sx, row * self.sub_y + sy
+    def at(self, x, y):
+        #name of the tile at a grid cell, None outside the grid
+        if x < 0 or y < 0 or x >= self.cols * self.sub_x or y >= self.rows * self.sub_y:
+            return None
+        col, sx = divmod(x, self.sub_x)
+        row, sy = divmod(y, self.sub_y)
+        return self.name_of(col, row, sx, sy)
+    def next(self, name):
+        index = self.index(name) + 1
+        return self.name(index) if index < len(self) else None
+    def range(self, first=None, last=None):
+        #inclusive, like tile_names
+        start = 0 if first is None else self.index(first)
+        end = len(self) if last is None else self.index(last) + 1
+        return self[start:end]
+    def select(self, spec):
+        #'A0A0:B9B1' range, 'A0A0:' open range, anything else a single name
+        if ':' in spec:
+            first, last = spec.split(':', 1)
+            return self.range(first or None, last or None)
+        return [spec] if spec in self else []
+
+default = TileRegistry()
+
+def manifest(registry, entries):
+    #entries: {tile name: {'object': ..., 'mesh': ...}} -> json ready dict with the grid size and cells
+    tiles = {}
+    for name in sorted(entries, key=lambda name: registry.index(name) if name in registry else len(registry)):
+        entry = dict(entries[name])
+        if name in registry:
+            entry['index'] = registry.index(name)
+            entry['cell'] = list(registry.cell(name))
+        tiles[name] = entry
+    return {'grid': {'cols': registry.cols, 'rows': registry.rows, 'sub_x': registry.sub_x, 'sub_y': registry.sub_y}, 'tiles': tiles}
+def save_manifest(path, registry, entries):
+    with open(path, 'w') as file:
+        json.dump(manifest(registry, entries), file, indent=2)
+    return path
+def load_manifest(path):
+    #returns (registry, {tile name: entry})
+    with open(path) as file:
+        data = json.load(file)
+    return TileRegistry(**data['grid']), data['tiles']
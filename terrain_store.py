@@ -0,0 +1,65 @@
+# Weight layers of every tile as flat float32 arrays in memory mapped .npy files, <directory>/<tile>/<layer>.npy
+# Values are in vertex index order, so syncing with vertex groups is one bulk read or write per tile
+# No bpy in here, the arrays can be inspected or processed outside Blender
+
+import os
+import numpy as np
+
+class WeightStore:
+    def __init__(self, directory):
+        self.directory = directory
+        #(tile, layer) -> open memmap
+        self.maps = {}
+    def path(self, tile, layer):
+        return os.path.join(self.directory, tile, layer + '.npy')
+    def tiles(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if os.path.isdir(os.path.join(self.directory, name)))
+    def layers(self, tile):
+        folder = os.path.join(self.directory, tile)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(name[:-4] for name in os.listdir(folder) if name.endswith('.npy'))
+    def has(self, tile, layer):
+        return (tile, layer) in self.maps or os.path.exists(self.path(tile, layer))
+    def layer(self, tile, layer, count=None, default=0.0):
+        #memmap of the layer, created (filled with default) when missing and count is given
+        key = (tile, layer)
+        values = self.maps.get(key)
+        if values is not None and (count is None or len(values) == count):
+            return values
+        path = self.path(tile, layer)
+        if os.path.exists(path):
+            values = np.load(path, mmap_mode='r+')
+            if count is not None and len(values) != count:
+                raise ValueError('%s/%s holds %d values, the mesh has %d' % (tile, layer, len(values), count))
+        elif count is None:
+            raise KeyError(key)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            values = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(count,))
+            values[:] = default
+        self.maps[key] = values
+        return values
+    def set_layer(self, tile, layer, values):
+        #replaces the file when the length changes
+        values = np.asarray(values, dtype=np.float32).ravel()
+        key = (tile, layer)
+        if self.has(tile, layer) and len(self.layer(tile, layer)) != len(values):
+            self.close(tile, layer)
+            os.remove(self.path(tile, layer))
+        self.layer(tile, layer, len(values))[:] = values
+        return self.maps[key]
+    def remove(self, tile, layer):
+        self.close(tile, layer)
+        if os.path.exists(self.path(tile, layer)):
+            os.remove(self.path(tile, layer))
+    def flush(self):
+        for values in self.maps.values():
+            values.flush()
+    def close(self, tile=None, layer=None):
+        #flushes and drops the maps of one layer, one tile or everything
+        for key in list(self.maps):
+            if (tile is None or key[0] == tile) and (layer is None or key[1] == layer):
+                self.maps.pop(key).flush()
@@ -0,0 +1,196 @@
+# Runs terrain steps over a world kept as one .blend per tile, with only a 3x3 window of tiles loaded at a time
+# Split a world into a tile library once:
+#   blender --background world.blend --python terrain_stream.py -- --split --library /data/tiles
+# Then stream steps over it, memory stays at one window whatever the world size:
+#   blender --background --factory-startup --python terrain_stream.py -- --library /data/tiles --steps slopes,seams,export_tiles
+
+import bpy
+import sys
+import os
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import terrain_tiles_beta as terrain
+import terrain_core as core
+import terrain_registry as registry
+import terrain_batch
+
+#steps that need every tile at once and cannot be streamed
+global_steps = ['export', 'bleed', 'manifest', 'chess']
+
+def tile_path(library, name):
+    return os.path.join(library, name + '.blend')
+def manifest_path(library):
+    return os.path.join(library, 'tiles.json')
+def library_tiles(library):
+    #{cell: name} from the TileGrid cells recorded by split_world, the same cells bleed_seams_all_objects uses
+    path = manifest_path(library)
+    if not os.path.exists(path):
+        raise RuntimeError('no ' + path + ', split the world into the library again')
+    grid, entries = registry.load_manifest(path)
+    return dict((tuple(entry['grid_cell']), name) for name, entry in entries.items())
+def split_world(library, objects=None):
+    #one .blend per tile, holding the object and what it uses (mesh, materials, images)
+    #the tiles' TileGrid cells go into tiles.json, names alone do not say where a tile sits
+    if objects is None:
+        objects = [obj for obj in bpy.context.scene.objects if obj.type == 'MESH' and obj.name in terrain.tiles]
+    grid = terrain.TileGrid(objects)
+    os.makedirs(library, exist_ok=True)
+    entries = terrain.tile_entries(objects)
+    for object in objects:
+        bpy.data.libraries.write(tile_path(library, object.name), {object}, fake_user=True)
+        entry = entries.setdefault(object.name, {'object': object.name, 'mesh': object.data.name})
+        entry['grid_cell'] = list(grid.coord(object))
+    registry.save_manifest(manifest_path(library), terrain.tiles, entries)
+    return len(objects)
+def load_tile(library, name):
+    #appended, not linked, so the steps can edit it
+    with bpy.data.libraries.load(tile_path(library, name), link=False) as (data_from, data_to):
+        data_to.objects = [name]
+    object = data_to.objects[0]
+    bpy.context.scene.collection.objects.link(object)
+    return object
+def save_tile(library, object):
+    bpy.data.libraries.write(tile_path(library, object.name), {object}, fake_user=True)
+def unload_tile(object):
+    mesh = object.data
+    terrain.invalidate_mesh_cache(object)
+    bpy.data.objects.remove(object)
+    if mesh.users == 0:
+        bpy.data.meshes.remove(mesh)
+
+class Window:
+    #tiles loaded around the current center, tiles that leave the window are saved (when changed) and unloaded
+    def __init__(self, library, cells):
+        self.library = library
+        self.cells = cells
+        self.loaded = {}
+        self.changed = set()
+        self.peak = 0
+    def move(self, wanted):
+        wanted = set(cell for cell in wanted if cell in self.cells)
+        leaving = [cell for cell in self.loaded if cell not in wanted]
+        for cell in leaving:
+            self.drop(cell)
+        if leaving:
+            #materials and images the tiles brought along
+            bpy.data.orphans_purge(do_recursive=True)
+        for cell in sorted(wanted):
+            if cell not in self.loaded:
+                self.loaded[cell] = load_tile(self.library, self.cells[cell])
+        self.peak = max(self.peak, len(self.loaded))
+        terrain.invalidate_bounding_box_cache()
+        return self.loaded
+    def drop(self, cell):
+        object = self.loaded.pop(cell)
+        if cell in self.changed:
+            save_tile(self.library, object)
+            self.changed.discard(cell)
+        unload_tile(object)
+    def close(self):
+        self.move([])
+
+def around(cell):
+    x, y = cell
+    return [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+def sweep_order(cells):
+    #column by column so consecutive windows share six tiles
+    return sorted(cells)
+def run_tile_steps(window, steps):
+    #one tile loaded at a time, every step runs on it before it is saved
+    for cell in sweep_order(window.cells):
+        object = window.move([cell])[cell]
+        for step in steps:
+            terrain_batch.select_tiles([object])
+            terrain_batch.stages[step][0]()
+        window.changed.add(cell)
+    window.close()
+def bleed_window_seams(window, cell, group_name=None, seed=0, falloff=0.015):
+    #right and backward seams of the center tile, so the sweep touches every seam once
+    objects = window.loaded
+    center = objects[cell]
+    if group_name is None:
+        if center.vertex_groups.active is None:
+            return 0
+        group_name = center.vertex_groups.active.name
+    tiles = dict((coord, terrain.tile_from_object(object, [group_name], coord)) for coord, object in objects.items())
+    before = dict((coord, core.content_hash([tile.layer(group_name)])) for coord, tile in tiles.items())
+    count = core.bleed_seams(tiles, group_name, seed, falloff, set([(cell, 1), (cell, 3)]))
+    #only the tiles on the bled seams and their corners change, the others are neither written nor saved
+    changed = dict((coord, tile) for coord, tile in tiles.items() if core.content_hash([tile.layer(group_name)]) != before[coord])
+    terrain.tiles_to_objects(changed, [group_name])
+    window.changed.update(changed)
+    return count
+def slope_window(window, cell, group_name=None, seed=0):
+    #slope of the center tile stitched with the 8 around it, only the center is written
+    center = window.loaded[cell]
+    terrain_batch.select_tiles([center])
+    terrain.slope_all_objects(context=[object for coord, object in window.loaded.items() if coord != cell])
+    window.changed.add(cell)
+    return 1
+#steps that need the tiles around the one they write
+window_steps = {'seams': bleed_window_seams, 'slopes': slope_window}
+def run_window_step(window, step, group_name=None, seed=0):
+    count = 0
+    for cell in sweep_order(window.cells):
+        window.move(around(cell))
+        count += window_steps[step](window, cell, group_name, seed)
+    window.close()
+    return count
+def passes(steps):
+    #consecutive per tile steps share one sweep, window steps get their own
+    found = []
+    for step in steps:
+        if step in window_steps:
+            found.append(('window', [step]))
+        elif found and found[-1][0] == 'tile':
+            found[-1][1].append(step)
+        else:
+            found.append(('tile', [step]))
+    return found
+def stream(library, steps, group_name=None, seed=0):
+    #returns [(steps, seconds, peak tiles loaded)]
+    cells = library_tiles(library)
+    bpy.ops.wm.read_homefile(use_empty=True)
+    terrain.invalidate_mesh_cache()
+    for step in steps:
+        for addon in terrain_batch.stages.get(step, (None, []))[1]:
+            terrain_batch.enable_addon(addon)
+    timings = []
+    for kind, names in passes(steps):
+        window = Window(library, cells)
+        start = time.perf_counter()
+        if kind == 'window':
+            run_window_step(window, names[0], group_name, seed)
+        else:
+            run_tile_steps(window, names)
+        seconds = time.perf_counter() - start
+        timings.append((names, seconds, window.peak))
+        print('%-24s %10.3fs  (%d tiles, at most %d loaded)' % (','.join(names), seconds, len(cells), window.peak))
+    return timings
+
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(prog='terrain_stream.py', description='run terrain steps over a tile library one window at a time')
+    parser.add_argument('--library', required=True, help='directory with one .blend per tile')
+    parser.add_argument('--split', action='store_true', help='write the tiles of the open .blend into the library')
+    parser.add_argument('--steps', default='', help='comma separated: ' + ','.join(sorted(window_steps)) + ' or a terrain_batch step')
+    parser.add_argument('--group', default=None, help='group for the seam step, defaults to each tile\'s active group')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.split:
+        print('terrain_stream: %d tiles written to %s' % (split_world(args.library), args.library))
+        return 0
+    steps = [step for step in args.steps.split(',') if step]
+    for step in steps:
+        if step in global_steps or (step not in window_steps and step not in terrain_batch.stages):
+            parser.error('step %s cannot be streamed' % step)
+        #a neighbor step without a window version would run on a lone tile and break its seams
+        if step not in window_steps and terrain_batch.stage_inputs.get(step, (None, False))[1]:
+            parser.error('step %s needs its neighbors and has no windowed version' % step)
+    stream(args.library, steps, args.group, args.seed)
+    return 0
+
+if __name__ == '__main__':
+    main()
@@ -4,35 +4,94 @@
 
 import bpy
 import bmesh
+import os
+import sys
+import time
+import json
 import random
+import numpy as np
 import mathutils
+import mathutils.kdtree
 from mathutils import Vector
 from mathutils import Matrix
+#bpy free tile model and weight algorithms live next to this file
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import terrain_core as core
+import terrain_erosion as erosion
+import terrain_registry as registry
+import terrain_store as store
 
+#per-mesh caches (spatial index etc), keyed by mesh name
+#everything cached only depends on xy, so the cache is dropped when the xy coordinates change
+#hashing the coordinates is O(V), so per vertex queries skip it (validate=False) and trust the last check,
+#bulk callers and run_batch validate once per tile
+mesh_cache = {}
+def mesh_fingerprint(object):
+    #hash of the xy coordinates, sculpting heights keeps the cache
+    count = len(object.data.vertices)
+    co = np.empty(count * 3, dtype=np.float32)
+    object.data.vertices.foreach_get('co', co)
+    return core.content_hash([co.reshape(count, 3)[:, :2]])
+def get_mesh_cache(object, validate=True):
+    cache = mesh_cache.get(object.data.name)
+    #without validate only a changed vertex count drops the cache
+    if not validate and cache is not None and cache['count'] == len(object.data.vertices):
+        return cache
+    fingerprint = mesh_fingerprint(object)
+    if cache is None or cache['fingerprint'] != fingerprint:
+        cache = {'fingerprint': fingerprint, 'count': len(object.data.vertices)}
+        mesh_cache[object.data.name] = cache
+    return cache
+def invalidate_mesh_cache(object=None):
+    if object is None:
+        mesh_cache.clear()
+        return None
+    mesh_cache.pop(object.data.name, None)
+def vert_tree(object, validate=True):
+    #xy only, z is ignored by all nearest queries
+    cache = get_mesh_cache(object, validate)
+    tree = cache.get('tree')
+    if tree is None:
+        vertices = object.data.vertices
+        tree = mathutils.kdtree.KDTree(len(vertices))
+        for vertex in vertices:
+            tree.insert((vertex.co.x, vertex.co.y, 0.0), vertex.index)
+        tree.balance()
+        cache['tree'] = tree
+    return tree
+def nearest_vert_index(object, vector):
+    co, index, dist = vert_tree(object, False).find((vector[0], vector[1], 0.0))
+    return index
+def nearest_vert_indices(object, vectors):
+    #batch version, vectors can be any sequence of xy(z) points
+    find = vert_tree(object).find
+    return [find((v[0], v[1], 0.0))[1] for v in vectors]
+def nearest_verts_n(object, vector, n):
+    found = vert_tree(object, False).find_n((vector[0], vector[1], 0.0), n)
+    return [index for co, index, dist in found]
 def nearest_vert(object, vector):
-    vert = object.data.vertices[0]
-    thresh = 10000.0
-    for vertex in object.data.vertices:
-        vl = Vector((vertex.co.x, vertex.co.y, vector.z))
-        l = (vl - vector).length_squared
-        if l < thresh:
-            vert = vertex
-            thresh = l
+    vert = object.data.vertices[nearest_vert_index(object, vector)]
     vert.select = True
     return vert
-def nearest_bvert(bm, vector):
-    vert = bm.verts[0]
-    thresh = 10000.0
+def bvert_tree(bm):
+    #bmesh has no stable name to cache by, build once and pass it to nearest_bvert
+    bm.verts.ensure_lookup_table()
+    tree = mathutils.kdtree.KDTree(len(bm.verts))
     for vertex in bm.verts:
-        vl = Vector((vertex.co.x, vertex.co.y, vector.z))
-        l = (vl - vector).length_squared
-        if l < thresh:
-            vert = vertex
-            thresh = l
+        tree.insert((vertex.co.x, vertex.co.y, 0.0), vertex.index)
+    tree.balance()
+    return tree
+def nearest_bvert(bm, vector, tree=None):
+    if tree is None:
+        tree = bvert_tree(bm)
+    vert = bm.verts[tree.find((vector[0], vector[1], 0.0))[1]]
     vert.select = True
     return vert
 def nearest_vert_from_objects(objectA, objectB, vertA):
     return nearest_vert(objectB, vertA.co)
+def nearest_verts_from_objects(objectA, objectB, indicesA):
+    verticesA = objectA.data.vertices
+    return nearest_vert_indices(objectB, [verticesA[i].co for i in indicesA])
 def near(number, threshold, error):
     difference = threshold - number
     if difference < 0.0:
@@ -46,133 +105,171 @@ def abs(number):
 def lerp(numA, numB, amt):
     diff = (numB - numA) * amt
     return numA + diff
+def vert_coordinates(object):
+    count = len(object.data.vertices)
+    co = np.empty(count * 3, dtype=np.float32)
+    object.data.vertices.foreach_get('co', co)
+    return co.reshape(count, 3)
+#neighbor directions, same order as get_object_relations
+sides = ['left', 'right', 'forward', 'backward']
+def vert_adjacency(object, validate=True):
+    #csr neighbor arrays (indptr, indices) plus one neighbor index per side (-1 if none)
+    cache = get_mesh_cache(object, validate)
+    adjacency = cache.get('adjacency')
+    if adjacency is not None:
+        return adjacency
+    mesh = object.data
+    count = len(mesh.vertices)
+    co = vert_coordinates(object)
+    edges = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get('vertices', edges)
+    edges = edges.reshape(-1, 2)
+    source = np.concatenate((edges[:, 0], edges[:, 1]))
+    target = np.concatenate((edges[:, 1], edges[:, 0]))
+    #keep edge order inside each vertex so the first match wins like walking object.data.edges
+    edge_order = np.concatenate((np.arange(len(edges)), np.arange(len(edges))))
+    order = np.lexsort((edge_order, source))
+    source = source[order]
+    indices = target[order]
+    indptr = np.zeros(count + 1, dtype=np.int32)
+    np.cumsum(np.bincount(source, minlength=count), out=indptr[1:])
+    delta = co[indices] - co[source]
+    masks = [delta[:, 0] < -0.005, delta[:, 0] > 0.005, delta[:, 1] < -0.005, delta[:, 1] > 0.005]
+    directions = np.full((4, count), -1, dtype=np.int32)
+    for side, mask in enumerate(masks):
+        src = source[mask]
+        first_src, first = np.unique(src, return_index=True)
+        directions[side][first_src] = indices[mask][first]
+    adjacency = {'indptr': indptr, 'indices': indices, 'directions': directions}
+    cache['adjacency'] = adjacency
+    return adjacency
+def vert_neighbors(object, index):
+    adjacency = vert_adjacency(object, False)
+    indptr = adjacency['indptr']
+    return adjacency['indices'][indptr[index]:indptr[index + 1]]
+def neighboring_vert_index(object, index, side):
+    return int(vert_adjacency(object, False)['directions'][side][index])
+def neighboring_vert(object, vertex, side):
+    index = neighboring_vert_index(object, vertex.index, side)
+    if index < 0:
+        return None
+    return object.data.vertices[index]
 def neighboring_vert_left(object, vertex):
-    for edge in object.data.edges:
-        if vertex.index not in edge.vertices:
-            continue
-        other = object.data.vertices[edge.vertices[0]]
-        if vertex.index == edge.vertices[0]:
-            other = object.data.vertices[edge.vertices[1]]
-        if other.co.x + 0.005 < vertex.co.x:
-            return other
-    return None
+    return neighboring_vert(object, vertex, 0)
 def neighboring_vert_right(object, vertex):
-    for edge in object.data.edges:
-        if vertex.index not in edge.vertices:
-            continue
-        other = object.data.vertices[edge.vertices[0]]
-        if vertex.index == edge.vertices[0]:
-            other = object.data.vertices[edge.vertices[1]]
-        if other.co.x - 0.005 > vertex.co.x:
-            return other
-    return None
+    return neighboring_vert(object, vertex, 1)
 def neighboring_vert_forward(object, vertex):
-    for edge in object.data.edges:
-        if vertex.index not in edge.vertices:
-            continue
-        other = object.data.vertices[edge.vertices[0]]
-        if vertex.index == edge.vertices[0]:
-            other = object.data.vertices[edge.vertices[1]]
-        if other.co.y + 0.005 < vertex.co.y:
-            return other
-    return None
+    return neighboring_vert(object, vertex, 2)
 def neighboring_vert_backward(object, vertex):
-    for edge in object.data.edges:
-        if vertex.index not in edge.vertices:
-            continue
-        other = object.data.vertices[edge.vertices[0]]
-        if vertex.index == edge.vertices[0]:
-            other = object.data.vertices[edge.vertices[1]]
-        if other.co.y - 0.005 > vertex.co.y:
-            return other
-    return None
+    return neighboring_vert(object, vertex, 3)
+def vert_walk(object, index, side, count=None):
+    #indices along a row/column starting after index, at most count steps
+    direction = vert_adjacency(object, False)['directions'][side]
+    walk = []
+    index = direction[index]
+    while index >= 0 and (count is None or len(walk) < count):
+        walk.append(int(index))
+        index = direction[index]
+    return walk
+#world space bbox corners per object name, reused while matrix_world and bound_box are unchanged
+bbox_cache = {}
+def bounding_box_corners(object):
+    matrix = tuple(v for row in object.matrix_world for v in row)
+    bound_box = tuple(v for corner in object.bound_box for v in corner)
+    cached = bbox_cache.get(object.name)
+    if cached is not None and cached[0] == matrix and cached[1] == bound_box:
+        return cached[2]
+    m = np.array(matrix).reshape(4, 4)
+    corners = np.array(bound_box).reshape(8, 3) @ m[:3, :3].T + m[:3, 3]
+    bbox_cache[object.name] = (matrix, bound_box, corners)
+    return corners
+def invalidate_bounding_box_cache(object=None):
+    if object is None:
+        bbox_cache.clear()
+        return None
+    bbox_cache.pop(object.name, None)
+def get_bounding_box_extremes_array(objects):
+    #(N, 6) columns: left x, right x, upward z, downward z, forward y, backward y
+    if len(objects) == 0:
+        return np.zeros((0, 6))
+    corners = np.stack([bounding_box_corners(obj) for obj in objects])
+    lo = corners.min(axis=1)
+    hi = corners.max(axis=1)
+    return np.stack((lo[:, 0], hi[:, 0], hi[:, 2], lo[:, 2], lo[:, 1], hi[:, 1]), axis=1)
 def get_bounding_box_extremes(object):
-    object_matrix = object.matrix_world
-    bbox_corners = [object_matrix @ Vector(corner) for corner in object.bound_box]
-    left = bbox_corners[0]
-    right = left
-    upward = left
-    downward = left
-    forward = left
-    backward = left
-    for corner in bbox_corners:
-        if corner.x < left.x:
-            left = corner
-        if corner.x > right.x:
-            right = corner
-        if corner.y < forward.y:
-            forward = corner
-        if corner.y > backward.y:
-            backward = corner
-        if corner.z < downward.z:
-            downward = corner
-        if corner.z > upward.z:
-            upward = corner
-    list = [left, right, upward, downward, forward, backward]
+    corners = bounding_box_corners(object)
+    #first corner wins on ties, like the old strict comparisons
+    picks = [corners[:, 0].argmin(), corners[:, 0].argmax(), corners[:, 2].argmax(), corners[:, 2].argmin(), corners[:, 1].argmin(), corners[:, 1].argmax()]
+    list = [Vector(tuple(corners[i])) for i in picks]
     return list
 def get_bounding_box_dimensions(object):
-    list = get_bounding_box_extremes(object)
-    vec = Vector(((list[1].x - list[0].x)/1, (list[5].y - list[4].y)/1, (list[2].z - list[3].z)/1))
+    e = get_bounding_box_extremes_array([object])[0]
+    vec = Vector((e[1] - e[0], e[5] - e[4], e[2] - e[3]))
     return vec
 def get_bounding_box_center(object):
-    extremes = get_bounding_box_extremes(object)
-    locx = (extremes[1].x + extremes[0].x) * 0.5
-    locy = (extremes[5].y + extremes[4].y) * 0.5
-    locz = (extremes[3].z + extremes[2].z) * 0.5
-    vec = Vector((locx, locy, locz))
+    e = get_bounding_box_extremes_array([object])[0]
+    vec = Vector(((e[1] + e[0]) * 0.5, (e[5] + e[4]) * 0.5, (e[3] + e[2]) * 0.5))
     return vec
-def get_object_relations(objects, object):
-    if len(objects) < 2:
-        rels = [None, None, None, None]
-        return rels
-    default_obj = objects[0]
-    if object == objects[0]:
-        default_obj = objects[1]
-    main_loc = get_bounding_box_center(object)
-    def_loc = get_bounding_box_center(default_obj)
-    left = default_obj
-    left_loc = def_loc
-    right = default_obj
-    right_loc = def_loc
-    forward = default_obj
-    forward_loc = def_loc
-    backward = default_obj
-    backward_loc = def_loc
-    for obj in objects:
-        if obj == object:
-            continue
-        loc = get_bounding_box_center(obj)
-        isleft = loc.x + 0.005 < main_loc.x
-        isright = loc.x - 0.005 > main_loc.x
-        isforward = loc.y + 0.005 < main_loc.y
-        isbackward = loc.y - 0.005 > main_loc.y
-        if isleft or isright:
-            if not near(loc.y, main_loc.y, 0.01):
-                continue
-        if isforward or isbackward:
-            if not near(loc.x, main_loc.x, 0.01):
-                continue
-        if (left == default_obj or loc.x > left_loc.x) and isleft:
-            left = obj
-            left_loc = loc
-        elif (right == default_obj or loc.x < right_loc.x) and isright:
-            right = obj
-            right_loc = loc
-        if (forward == default_obj or loc.y > forward_loc.y) and isforward:
-            forward = obj
-            forward_loc = loc
-        elif (backward == default_obj or loc.y < backward_loc.y) and isbackward:
-            backward = obj
-            backward_loc = loc
-    if left_loc.x - 0.005 > main_loc.x:
-        left = None
-    if right_loc.x + 0.005 < main_loc.x:
-        right = None
-    if forward_loc.y - 0.005 > main_loc.y:
-        forward = None
-    if backward_loc.y + 0.005 < main_loc.y:
-        backward = None
-    relations = [left, right, forward, backward]
+def get_bounding_box_centers(objects):
+    e = get_bounding_box_extremes_array(objects)
+    return np.stack(((e[:, 1] + e[:, 0]) * 0.5, (e[:, 5] + e[:, 4]) * 0.5, (e[:, 3] + e[:, 2]) * 0.5), axis=1)
+#neighbor cell offsets per side, forward is -y like get_object_relations
+side_offsets = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+def center_spacing(values, width):
+    #median gap between neighboring columns (or rows) of centers, tiles in one column only differ by float noise
+    #the width falls back for a single column and sets how far apart two columns must be
+    gaps = np.diff(np.sort(values))
+    gaps = gaps[gaps > max(width * 0.25, 1e-4)]
+    return float(np.median(gaps)) if len(gaps) > 0 else width
+class TileGrid:
+    #buckets tiles by bounding box center into integer cells, holes stay empty
+    def __init__(self, objects, spacing=None):
+        self.objects = [obj for obj in objects]
+        extremes = get_bounding_box_extremes_array(self.objects)
+        centers = np.stack(((extremes[:, 0] + extremes[:, 1]) * 0.5, (extremes[:, 4] + extremes[:, 5]) * 0.5), axis=1)
+        if spacing is None:
+            spacing = (1.0, 1.0)
+            if len(self.objects) > 0:
+                #center to center, tiles that do not share their border verts sit further apart than their width
+                widths = (float(np.median(extremes[:, 1] - extremes[:, 0])), float(np.median(extremes[:, 5] - extremes[:, 4])))
+                spacing = (center_spacing(centers[:, 0], widths[0]), center_spacing(centers[:, 1], widths[1]))
+        self.spacing = (spacing[0] if spacing[0] > 0.0 else 1.0, spacing[1] if spacing[1] > 0.0 else 1.0)
+        self.origin = (0.0, 0.0)
+        if len(centers) > 0:
+            #snapped next to world 0 so any subset of the world gets the same cells (and seam seeds)
+            #the quarter keeps tiles centered on or between multiples of the spacing away from the rounding edge
+            low = centers.min(axis=0)
+            self.origin = tuple(float(low[n] - np.floor(low[n] / self.spacing[n] + 0.25) * self.spacing[n]) for n in range(2))
+        self.cells = {}
+        self.coords = {}
+        for obj, center in zip(self.objects, centers):
+            coord = self.cell(center)
+            if coord in self.cells:
+                #a dropped tile would silently lose its neighbors in every seam stage
+                raise ValueError(obj.name + ' and ' + self.cells[coord].name + ' share grid cell ' + str(coord))
+            self.cells[coord] = obj
+            self.coords[obj.name] = coord
+    def cell(self, location):
+        i = int(round((location[0] - self.origin[0]) / self.spacing[0]))
+        j = int(round((location[1] - self.origin[1]) / self.spacing[1]))
+        return (i, j)
+    def coord(self, object):
+        return self.coords.get(object.name)
+    def get(self, i, j):
+        return self.cells.get((i, j))
+    def neighbor(self, object, side):
+        coord = self.coords.get(object.name)
+        if coord is None:
+            return None
+        offset = side_offsets[side]
+        return self.cells.get((coord[0] + offset[0], coord[1] + offset[1]))
+    def relations(self, object):
+        return [self.neighbor(object, side) for side in range(4)]
+def get_object_relations(objects, object, grid=None):
+    #pass a TileGrid when asking for many tiles, building one is O(N)
+    if grid is None:
+        grid = TileGrid(objects)
+    relations = grid.relations(object)
     bpy.ops.object.select_all(action='DESELECT')
     for obj in relations:
         if obj is not None:
@@ -194,198 +291,220 @@ def make_circles_in_bounds(object, number):
     #bm = bmesh.new()
     #bm.from_mesh(object.data)
     #bm.verts.ensure_lookup_table()
+    points = []
     for n in range(0, number):
         v = co + (ax * random.random()) + (ay * random.random())
         v.z = random.random() * 25.0
-        nearest = nearest_vert(object, v).index#nearest_bvert(bm, v).index
-        circle = (nearest, v)
+        points.append(v)
+    nearest = nearest_vert_indices(object, points)
+    for i, v in zip(nearest, points):
+        object.data.vertices[i].select = True
+        circle = (i, v)
         circles.append(circle)
     #bm.to_mesh(object.data)
     object.data.update()
     #bm.free()
     return circles
 #def select_vertices_by_indices(object, vertices)
+def border_indices(object, error=0.01):
+    #index arrays of the four sides and the corners, from the mesh's own xy extent
+    #'separate' keeps the old elif order (left, right, forward, backward) so a corner lands on one side only
+    cache = get_mesh_cache(object)
+    borders = cache.get(('borders', error))
+    if borders is not None:
+        return borders
+    co = vert_coordinates(object)
+    count = len(co)
+    lo = co.min(axis=0) if count > 0 else np.zeros(3)
+    hi = co.max(axis=0) if count > 0 else np.zeros(3)
+    masks = [np.abs(co[:, 0] - lo[0]) <= error, np.abs(co[:, 0] - hi[0]) <= error, np.abs(co[:, 1] - lo[1]) <= error, np.abs(co[:, 1] - hi[1]) <= error]
+    sides_count = (masks[0] | masks[1]).astype(np.int32) + (masks[2] | masks[3])
+    taken = np.zeros(count, dtype=bool)
+    separate = []
+    for mask in masks:
+        separate.append(np.flatnonzero(mask & ~taken))
+        taken |= mask
+    borders = {'left': np.flatnonzero(masks[0]), 'right': np.flatnonzero(masks[1]), 'forward': np.flatnonzero(masks[2]), 'backward': np.flatnonzero(masks[3]), 'corners': np.flatnonzero(sides_count > 1), 'border': np.flatnonzero(taken), 'separate': separate}
+    cache[('borders', error)] = borders
+    return borders
+def select_verts(object, indices):
+    #replaces the vertex selection, edges are selected where both ends are
+    mesh = object.data
+    select = np.zeros(len(mesh.vertices), dtype=bool)
+    select[indices] = True
+    mesh.vertices.foreach_set('select', select)
+    edges = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get('vertices', edges)
+    edge_select = select[edges].reshape(-1, 2).all(axis=1)
+    mesh.edges.foreach_set('select', edge_select)
+    mesh.update()
+    return edge_select
+def set_edge_creases(object, edge_mask, value=1.0):
+    mesh = object.data
+    if bpy.app.version >= (4, 0, 0):
+        attribute = mesh.attributes.get('crease_edge')
+        if attribute is None:
+            attribute = mesh.attributes.new('crease_edge', 'FLOAT', 'EDGE')
+        data = attribute.data
+        key = 'value'
+    else:
+        data = mesh.edges
+        key = 'crease'
+    creases = np.empty(len(mesh.edges), dtype=np.float32)
+    data.foreach_get(key, creases)
+    creases[edge_mask] = value
+    data.foreach_set(key, creases)
+    mesh.update()
 def get_border_verts_separate(object):
-    offset = object.matrix_world @ object.location
-    bbox = get_bounding_box_extremes(object)
-    left = bbox[0] - offset
-    right = bbox[1] - offset
-    forward = bbox[4] - offset
-    backward = bbox[5] - offset
-    bm = bmesh.new()
-    bm.from_mesh(object.data)
-    bm.verts.ensure_lookup_table()
-    all_left = []
-    all_right = []
-    all_forward = []
-    all_backward = []
-    for i, vertex in enumerate(bm.verts):
-        if near(vertex.co.x, left.x, 0.01):
-            all_left.append(vertex.index)
-        elif near(vertex.co.x, right.x, 0.01):
-            all_right.append(vertex.index)
-        elif near(vertex.co.y, forward.y, 0.01):
-            all_forward.append(vertex.index)
-        elif near(vertex.co.y, backward.y, 0.01):
-            all_backward.append(vertex.index)
-        else:
-            vertex.select = False
-            continue
-        vertex.select = True
-    bm.to_mesh(object.data)
-    object.data.update()
-    bm.free()
-    lists = [all_left, all_right, all_forward, all_backward]
+    borders = border_indices(object)
+    select_verts(object, borders['border'])
+    lists = [side.tolist() for side in borders['separate']]
     return lists
 def get_border_verts_all(object):
-    #alternative approach: verts having only one face are boundary verts
-    object.select_set(True)
-    bpy.context.view_layer.objects.active = object
-    bpy.ops.object.mode_set(mode='EDIT')
-    offset = (object.matrix_world @ object.location) * 0.5
-    bbox = get_bounding_box_extremes(object)
-    left = bbox[0] - offset
-    right = bbox[1] - offset
-    forward = bbox[4] - offset
-    backward = bbox[5] - offset
-    #bpy.ops.mesh.select_all(action='DESELECT')
-    bm = bmesh.from_edit_mesh(object.data)#bmesh.new()
-    #bm.from_mesh(object.data)
-    bm.verts.ensure_lookup_table()
-    bm.edges.ensure_lookup_table()
-    #bm.verts[0].select = True
-    for i, vertex in enumerate(bm.verts):
-        border_count = 0
-        border = False
-        if near(vertex.co.x, left.x, 0.01):
-            border = True
-            border_count += 1
-        elif near(vertex.co.x, right.x, 0.01):
-            border = True
-            border_count += 1
-        if near(vertex.co.y, forward.y, 0.01):
-            border = True
-            border_count += 1
-        elif near(vertex.co.y, backward.y, 0.01):
-            border = True
-            border_count += 1
-        vertex.select = border_count > 1
-    #bmesh.update_edit_mesh(object.data)
-    #bm.to_mesh(object.data)
-    #object.data.update()
-    #bm.free()
-    verts = [vert for vert in object.data.vertices if vert.select]
-    creases = bm.edges.layers.crease.verify()#['SubSurfCrease']
-    edges = [edge for edge in bm.edges if edge.select]
-    print(object.name, len(edges))
-    for edge in edges:
-        #edge = object.data.edges[edge_index]
-        #if edge.index in edges:
-        edge[creases] = 1.0#edge.crease = 1.0
-    bmesh.update_edit_mesh(object.data)
-    bpy.ops.object.mode_set(mode='OBJECT')
-    object.data.update()
+    #selects the corner verts and creases the border edges, without entering edit mode
+    borders = border_indices(object)
+    corners = borders['corners']
+    select_verts(object, corners)
+    #both ends on the same side, so a diagonal cutting a corner between two sides is not creased
+    edges = np.empty(len(object.data.edges) * 2, dtype=np.int32)
+    object.data.edges.foreach_get('vertices', edges)
+    edges = edges.reshape(-1, 2)
+    edge_crease = np.zeros(len(edges), dtype=bool)
+    for name in sides:
+        side = np.zeros(len(object.data.vertices), dtype=bool)
+        side[borders[name]] = True
+        edge_crease |= side[edges].all(axis=1)
+    set_edge_creases(object, edge_crease, 1.0)
+    print(object.name, int(edge_crease.sum()))
+    verts = [object.data.vertices[i] for i in corners.tolist()]
     return verts
 def get_border_verts_every():
     objects = [obj for obj in bpy.context.selected_objects]
     for obj in objects:
         get_border_verts_all(obj)
 def get_left_verts(object):
-    bpy.ops.object.select_all(action='DESELECT')
-    object.select_set(True)
-    bpy.context.view_layer.objects.active = object
-    bbox = get_bounding_box_extremes(object)
-    left = bbox[0] - (object.matrix_world @ object.location)
-    bm = bmesh.new()
-    bm.from_mesh(object.data)
-    bm.verts.ensure_lookup_table()
-    for i, vertex in enumerate(bm.verts):
-        border = False
-        if near(vertex.co.x, left.x, 0.01):
-            border = True
-        vertex.select = border
-    bm.to_mesh(object.data)
-    object.data.update()
-    bm.free()
-    verts = [vert for vert in object.data.vertices if vert.select]
+    left = border_indices(object)['left']
+    select_verts(object, left)
+    verts = [object.data.vertices[i] for i in left.tolist()]
     return verts
+def border_distance(object, borders=sides, limit=None):
+    #edge steps of every vertex from the nearest of the given borders, -1 past limit
+    adjacency = vert_adjacency(object)
+    found = border_indices(object)
+    sources = np.concatenate([found[side] for side in borders]) if len(borders) > 0 else np.empty(0, dtype=np.int64)
+    return core.graph_distance(adjacency['indptr'], adjacency['indices'], sources, limit)
+def border_falloff(object, group_index=None, borders=sides, count=100, curve='linear', start=1.0, end=0.1):
+    #paints the falloff into the group for vertices less than count loops from the borders, the rest keep their weight
+    #the defaults match the old left edge loop walk: 1.0 - 0.009 per loop
+    if group_index is None:
+        group_index = object.vertex_groups.active_index
+    distance = border_distance(object, borders, count - 1)
+    inside = distance >= 0
+    weights = read_vertex_group_weights(object, group_index)
+    weights[inside] = core.distance_falloff(distance[inside], count, curve, start, end)
+    write_vertex_group_weights(object, group_index, weights)
+    return weights
+def border_falloff_all_objects(borders=sides, count=100, curve='linear', start=1.0, end=0.1):
+    objects = [obj for obj in bpy.context.selected_objects if obj.type == 'MESH']
+    return run_batch(objects, lambda object: border_falloff(object, None, borders, count, curve, start, end))
 def get_left_edgeloops(object):
     bpy.ops.object.select_all(action='DESELECT')
     object.select_set(True)
     bpy.context.view_layer.objects.active = object
-    bbox = get_bounding_box_extremes(object)
-    left = bbox[0] - (object.matrix_world @ object.location)
-    bm = bmesh.new()
-    bm.from_mesh(object.data)
-    bm.verts.ensure_lookup_table()
-    bverts = []
-    for i, vertex in enumerate(bm.verts):
-        border = False
-        if near(vertex.co.x, left.x, 0.01):
-            border = True
-        vertex.select = border
-        if border:
-            bverts.append(vertex)
-    bm.select_mode = {'EDGE'}
-    bpy.context.tool_settings.mesh_select_mode = (False, True, False)
-    bloops = []#edges
-    loops = []#lists
-    for edge in bm.edges:
-        edge.select = False
-    #assumed to be ordered
-    for i, edge in enumerate(bm.edges):
-        #TODO: selects all edge loops BUT ONE(at end)
-        both = edge.verts[0] in bverts and edge.verts[1] in bverts
-        if both:
-            continue
-        connected = edge.verts[0] in bverts or edge.verts[1] in bverts
-        if not connected:
-            continue
-        #edge.verts[0].select = True
-        #edge.verts[1].select = True
-        eloops = []
-        if edge not in eloops:
-            eloops.append(edge)
-        loop = edge.link_loops[0]
-        count = 0
-        while count < 100:
-            if loop.edge not in eloops:
-                bloops.append(loop.edge)
-                eloops.append(loop.edge)
-            loop = loop.link_loop_prev.link_loop_radial_prev.link_loop_prev
-            loop.edge.select = True
-            count += 1
-        loops.append(eloops)
-    vg = object.vertex_groups.active
-    deform = bm.verts.layers.deform.active
-    vgi = object.vertex_groups.active_index
-    #group = object.vertex_groups.new(name=str(x)+'_'+str(y))
-    for loop in loops:
-        first = loop[0].verts[0] in loop[1].verts
-        vert = loop[0].verts[0]
-        if first:
-            vert = loop[0].verts[1]
-        w = 1.0
-        for edge in loop:
-            if vert is None:
-                continue
-            w -= 0.009
-            #v = []
-            #v.append(vert.index)
-            #vg.add(v, 0.6, 'ADD')
-            g = vert[deform]
-            g[vgi] = w#0.73
-            #vert = edge.other_vert(vert)
-            sfirst = vert == edge.verts[0]
-            vert = edge.verts[0]
-            if sfirst:
-                vert = edge.verts[1]
-    bm.to_mesh(object.data)
-    object.data.update()
-    bm.free()
-    verts = [vert for vert in object.data.vertices if vert.select]
+    bverts = border_indices(object)['left'].tolist()
+    select_verts(object, bverts)
+    border_falloff(object, None, ['left'])
+    verts = [object.data.vertices[i] for i in bverts]
     return verts
 
+def hash_groups(object, groups):
+    #None -> no groups, 'active' -> the active group, 'all' -> every group, or a list of names
+    if groups is None:
+        return []
+    if groups == 'active':
+        groups = [object.vertex_groups.active.name] if object.vertex_groups.active is not None else []
+    elif groups == 'all':
+        groups = sorted(vg.name for vg in object.vertex_groups)
+    return [name for name in groups if name in object.vertex_groups]
+def tile_hash_arrays(object, groups=None, indices=None):
+    #transform, coordinates and group weights of a tile, only the rows in indices when given
+    mesh = object.data
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', co)
+    co = co.reshape(-1, 3)
+    names = hash_groups(object, groups)
+    weights = read_vertex_groups(object, [object.vertex_groups[name].index for name in names]) if names else []
+    if indices is not None:
+        co = co[indices]
+        weights = [w[indices] for w in weights]
+    return [np.array(object.matrix_world, dtype=np.float32), co] + weights, names
+def tile_input_hash(object, groups=None, neighbors=(), params=None):
+    #content hash of what a stage reads from a tile; neighbors add their border rows
+    arrays, names = tile_hash_arrays(object, groups)
+    keys = [names, params]
+    for side, neighbor in enumerate(neighbors):
+        if neighbor is None:
+            continue
+        border, neighbor_names = tile_hash_arrays(neighbor, groups, border_indices(neighbor)['border'])
+        arrays += border
+        keys.append((side, neighbor.name, neighbor_names))
+    return core.content_hash(arrays, keys)
+def make_active(object, mode=None):
+    bpy.ops.object.select_all(action='DESELECT')
+    object.select_set(True)
+    bpy.context.view_layer.objects.active = object
+    if mode is not None:
+        bpy.ops.object.mode_set(mode=mode)
+def run_batch(objects, function, context='DATA', report=True):
+    #runs function(object) over the tiles with undo pushes off, selection is restored once at the end
+    #context: 'DATA' plain call (data api only), 'OVERRIDE' operators see the object through temp_override,
+    #'ACTIVE' the old deselect/select/active per object, for operators that switch modes
+    #returns timings, overhead is the time spent setting up the context instead of in function
+    view_layer = bpy.context.view_layer
+    edit = bpy.context.preferences.edit
+    use_global_undo = edit.use_global_undo
+    selected = [obj for obj in bpy.context.selected_objects]
+    active = view_layer.objects.active
+    if context == 'OVERRIDE' and not hasattr(bpy.context, 'temp_override'):
+        context = 'ACTIVE'
+    stats = {'objects': len(objects), 'work': 0.0, 'overhead': 0.0, 'total': 0.0}
+    results = []
+    start = time.perf_counter()
+    edit.use_global_undo = False
+    try:
+        for object in objects:
+            t0 = time.perf_counter()
+            if object.type == 'MESH':
+                #one coordinate check per tile, the per vertex queries inside function skip it
+                get_mesh_cache(object)
+            if context == 'OVERRIDE':
+                with bpy.context.temp_override(object=object, active_object=object, selected_objects=[object], selected_editable_objects=[object]):
+                    t1 = time.perf_counter()
+                    results.append(function(object))
+                    t2 = time.perf_counter()
+            else:
+                if context == 'ACTIVE':
+                    make_active(object)
+                t1 = time.perf_counter()
+                results.append(function(object))
+                t2 = time.perf_counter()
+            stats['work'] += t2 - t1
+            stats['overhead'] += (t1 - t0) + (time.perf_counter() - t2)
+    finally:
+        t3 = time.perf_counter()
+        if bpy.context.object is not None and bpy.context.object.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode='OBJECT')
+        bpy.ops.object.select_all(action='DESELECT')
+        for obj in selected:
+            obj.select_set(True)
+        view_layer.objects.active = active
+        edit.use_global_undo = use_global_undo
+        stats['overhead'] += time.perf_counter() - t3
+        stats['total'] = time.perf_counter() - start
+    if report:
+        print('%d objects: %.3fs work, %.3fs context overhead (%s)' % (len(objects), stats['work'], stats['overhead'], context))
+    stats['results'] = results
+    return stats
 def vertex_group_border_remove(object):
     verts = get_border_verts_all(object)
     indices = [v.index for v in verts]
@@ -441,81 +560,173 @@ def project_all_objects():
                             override = {'window': oWindow, 'screen': oScreen, 'area': oArea, 'region': oRegion, 'scene': bpy.context.scene, 'edit_object': bpy.context.edit_object, 'active_object': bpy.context.active_object, 'selected_objects': bpy.context.selected_objects}
                             bpy.ops.uv.project_from_view(override, correct_aspect=True, scale_to_bounds=True)
                             bpy.ops.object.mode_set(mode='OBJECT')
+def world_coordinates(object):
+    m = np.array([tuple(row) for row in object.matrix_world], dtype=np.float64)
+    return (vert_coordinates(object) @ m[:3, :3].T + m[:3, 3]).astype(np.float32)
+def project_uv(object, bounds=None, world=False):
+    #top down projection into the active uv layer, scaled to bounds (left, right, forward, backward)
+    #without bounds it fills 0..1 with the tile itself, like project_from_view with scale_to_bounds
+    mesh = object.data
+    co = world_coordinates(object) if world else vert_coordinates(object)
+    if bounds is None:
+        bounds = (co[:, 0].min(), co[:, 0].max(), co[:, 1].min(), co[:, 1].max())
+    left, right, forward, backward = bounds
+    loops = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loops)
+    uv = np.empty((len(loops), 2), dtype=np.float32)
+    uv[:, 0] = (co[loops, 0] - left) / max(right - left, 1e-8)
+    uv[:, 1] = (co[loops, 1] - forward) / max(backward - forward, 1e-8)
+    uv_layer = mesh.uv_layers.active
+    if uv_layer is None:
+        uv_layer = mesh.uv_layers.new()
+    uv_layer.data.foreach_set('uv', uv.ravel())
+    mesh.update()
+    return uv
+def project_uv_all_objects(world=False):
+    #headless replacement for project_all_objects, world=True keeps uvs continuous over the whole grid
+    objects = [obj for obj in bpy.context.selected_objects if obj.type == 'MESH']
+    bounds = None
+    if world and len(objects) > 0:
+        extremes = get_bounding_box_extremes_array(objects)
+        bounds = (extremes[:, 0].min(), extremes[:, 1].max(), extremes[:, 4].min(), extremes[:, 5].max())
+    return run_batch(objects, lambda object: project_uv(object, bounds, world))
+def calc_slope(object):
+    delete_vertex_group(object, 'slope')
+    bpy.ops.mesh.ant_slope_map(group_name="slope")
+    bpy.ops.object.mode_set(mode='OBJECT')
 def calc_slope_all_objects():
     objects = [obj for obj in bpy.context.selected_objects]
-    for object in objects:
-        bpy.ops.object.select_all(action='DESELECT')
-        object.select_set(True)
-        bpy.context.view_layer.objects.active = object
-        vg = object.vertex_groups.get('slope')
-        if vg is not None:
-            object.vertex_groups.remove(vg)
-        bpy.ops.mesh.ant_slope_map(group_name="slope")
-        bpy.ops.object.mode_set(mode='OBJECT')
+    return run_batch(objects, calc_slope, 'ACTIVE')
+def slope_all_objects(group_name='slope', context=()):
+    #slope of every selected tile from one stitched height map, so tile borders see their neighbors' heights
+    #context tiles are stitched in for their heights but not written, for updating part of a world
+    objects = [obj for obj in bpy.context.selected_objects if obj.type == 'MESH']
+    if len(objects) == 0:
+        return None
+    names = set(obj.name for obj in objects)
+    world = world_from_objects(objects + [obj for obj in context if obj.name not in names])
+    dx, dy = world.spacing()
+    world.set_layer(group_name, core.slope_map(world.heights, dx, dy))
+    tiles_to_objects(dict((coord, tile) for coord, tile in world.tiles.items() if tile.name in names), [group_name])
+    return world
 erosion_layers = ['rainmap', 'scree', 'avalanced', 'water', 'scour', 'deposit', 'flowrate', 'sediment', 'sedimentpct', 'capacity']
 def delete_vertex_group(object, group_name):
     vg = object.vertex_groups.get(group_name)
     if vg is not None:
         object.vertex_groups.remove(vg)
     return None
+#foreach_get key and width per attribute data type
+attribute_layouts = {'FLOAT': ('value', 1, np.float32), 'INT': ('value', 1, np.int32), 'BOOLEAN': ('value', 1, bool), 'FLOAT2': ('vector', 2, np.float32), 'FLOAT_VECTOR': ('vector', 3, np.float32), 'FLOAT_COLOR': ('color', 4, np.float32), 'BYTE_COLOR': ('color', 4, np.float32)}
+def snapshot_source(mesh, name):
+    #'co' is the vertex coordinates, anything else is looked up in mesh.attributes
+    if name == 'co':
+        return mesh.vertices, 'co', 3, np.float32
+    attribute = mesh.attributes.get(name)
+    if attribute is None:
+        raise KeyError(mesh.name + ' has no attribute ' + name)
+    key, width, dtype = attribute_layouts[attribute.data_type]
+    return attribute.data, key, width, dtype
+def snapshot_mesh(object, attributes=('co',)):
+    #flat buffers of the chosen attributes, restore them with restore_mesh
+    mesh = object.data
+    snapshot = {}
+    for name in attributes:
+        data, key, width, dtype = snapshot_source(mesh, name)
+        buffer = np.empty(len(data) * width, dtype=dtype)
+        data.foreach_get(key, buffer)
+        snapshot[name] = buffer
+    return snapshot
+def restore_mesh(object, snapshot, attributes=None):
+    #attributes picks a subset of the snapshot, default is all of it
+    mesh = object.data
+    if attributes is None:
+        attributes = list(snapshot.keys())
+    for name in attributes:
+        data, key, width, dtype = snapshot_source(mesh, name)
+        data.foreach_set(key, snapshot[name])
+    mesh.update()
+    if 'co' in attributes or 'position' in attributes:
+        invalidate_mesh_cache(object)
+def calc_erosion(object):
+    bpy.ops.object.mode_set(mode='WEIGHT_PAINT')
+    snapshot = snapshot_mesh(object)
+    for vg in erosion_layers:
+        delete_vertex_group(object, vg)
+    bpy.ops.mesh.eroder(Iterations=1, IterRiver=30, IterAva=5, IterDiffuse=5, Ef=0, Kd=0.1, Kt=1.0472, Kr=0.01, Kv=0, userainmap=True, Ks=0.5, Kdep=0.1, Kz=0.3, Kc=0.9, Ka=1, Kev=0.5, numexpr=True, Pd=0.2, Pa=0.5, Pw=1, smooth=True, showiterstats=False, showmeshstats=False)
+    #only the vertex groups are kept, the geometry goes back to how it was
+    restore_mesh(object, snapshot)
+    bpy.ops.object.mode_set(mode='OBJECT')
 def calc_erosion_all_objects():
     objects = [obj for obj in bpy.context.selected_objects]
-    for object in objects:
-        bpy.ops.object.select_all(action='DESELECT')
-        object.select_set(True)
-        bpy.context.view_layer.objects.active = object
-        bpy.ops.object.mode_set(mode='WEIGHT_PAINT')
-        bm = bmesh.new()
-        bm.from_mesh(object.data)
-        bm.verts.ensure_lookup_table()
-        for vg in erosion_layers:
-            delete_vertex_group(object, vg)
-        bpy.ops.mesh.eroder(Iterations=1, IterRiver=30, IterAva=5, IterDiffuse=5, Ef=0, Kd=0.1, Kt=1.0472, Kr=0.01, Kv=0, userainmap=True, Ks=0.5, Kdep=0.1, Kz=0.3, Kc=0.9, Ka=1, Kev=0.5, numexpr=True, Pd=0.2, Pa=0.5, Pw=1, smooth=True, showiterstats=False, showmeshstats=False)
-        for i, v in enumerate(object.data.vertices):
-            object.data.vertices[i].co = bm.verts[i].co + Vector((0,0,0))
-        bm.free()
-        bpy.ops.object.mode_set(mode='OBJECT')
+    return run_batch(objects, calc_erosion, 'ACTIVE')
 
-def random_vertex_group_all_objects():
+def erode_all_objects(processes=0, seed=0, **params):
+    #native replacement for calc_erosion_all_objects: no operator, no mode switching, tiles can go to a process pool
+    #params use terrain_erosion.default_params names (iter_river, kd, kt, ...), the 'rainmap' group is used when present
+    objects = [obj for obj in bpy.context.selected_objects if obj.type == 'MESH']
+    tiles = tiles_from_objects(objects, ['rainmap'])
+    erosion.erode_tiles(tiles.values(), processes, seed, **params)
+    tiles_to_objects(tiles, erosion_layers)
+    return tiles
+
+def read_vertex_groups(object, group_indices, default=0.0):
+    #one pass over the vertices' group memberships for all groups at once, no bmesh
+    #vertices outside a group (or an index of -1) read as default
+    vertex_ids = []
+    group_ids = []
+    values = []
+    for vertex in object.data.vertices:
+        for g in vertex.groups:
+            vertex_ids.append(vertex.index)
+            group_ids.append(g.group)
+            values.append(g.weight)
+    vertex_ids = np.array(vertex_ids, dtype=np.int64)
+    group_ids = np.array(group_ids, dtype=np.int64)
+    values = np.array(values, dtype=np.float32)
+    weights = []
+    for i in group_indices:
+        column = np.full(len(object.data.vertices), default, dtype=np.float32)
+        mask = group_ids == i
+        column[vertex_ids[mask]] = values[mask]
+        weights.append(column)
+    return weights
+def write_vertex_groups(object, group_indices, weights, mode='REPLACE'):
+    #mode 'ADD' adds onto the current weights, missing ones count as 0.0
+    #one vertex_group.add call per distinct weight, so painted and quantized layers write in a few calls
+    weights = [np.asarray(w, dtype=np.float32) for w in weights]
+    if mode == 'ADD':
+        weights = [current + w for current, w in zip(read_vertex_groups(object, group_indices), weights)]
+    for i, column in zip(group_indices, weights):
+        vg = object.vertex_groups[i]
+        values, inverse = np.unique(column, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        splits = np.cumsum(np.bincount(inverse, minlength=len(values)))[:-1]
+        for value, indices in zip(values.tolist(), np.split(order, splits)):
+            vg.add(indices.tolist(), value, 'REPLACE')
+    object.data.update()
+def read_vertex_group_weights(object, group_index, default=0.0):
+    return read_vertex_groups(object, [group_index], default)[0]
+def write_vertex_group_weights(object, group_index, weights, mode='REPLACE'):
+    write_vertex_groups(object, [group_index], [weights], mode)
+def vertex_group_index(object, group_name):
+    vg = object.vertex_groups.get(group_name)
+    if vg is None:
+        vg = object.vertex_groups.new(name=group_name)
+    return vg.index
+def random_vertex_group(object, number=100, radius=25.0, strength=0.1):
+    circles = make_circles_in_bounds(object, number)
+    centers = [(circle[1].x, circle[1].y) for circle in circles]
+    weights = core.circle_falloff_weights(vert_coordinates(object), centers, radius, strength)
+    write_vertex_group_weights(object, object.vertex_groups.active_index, weights, 'ADD')
+    return weights
+def random_vertex_group_all_objects(number=100, radius=25.0, strength=0.1):
     objects = [obj for obj in bpy.context.selected_objects]
-    for object in objects:
-        bpy.ops.object.select_all(action='DESELECT')
-        object.select_set(True)
-        bpy.context.view_layer.objects.active = object
-        vg = object.vertex_groups.active
-        #left_verts = get_left_edgeloops(object)
-        circles = make_circles_in_bounds(object, 100)#TODO: set radius multiplier param
-        bm = bmesh.new()
-        bm.from_mesh(object.data)
-        bm.verts.ensure_lookup_table()
-        vg = object.vertex_groups.active
-        deform = bm.verts.layers.deform.active
-        vgi = object.vertex_groups.active_index
-        for circle in circles:
-            ci = circle[0]
-            cv = circle[1]
-            #print('vert at index ' + str(ci) + ' at ' + str(cv))
-            for vert in bm.verts:
-                g = vert[deform]
-                diff = (cv - Vector((vert.co.x, vert.co.y, cv.z))).length#_squared
-                sqr25 = 25.0# * 25.0
-                if diff > sqr25:
-                    diff = sqr25
-                diff = (sqr25 - diff) / (sqr25 * 10.0)
-                if vgi not in g:
-                    g[vgi] = 0.0
-                g[vgi] += diff
-            
-        bm.to_mesh(object.data)
-        object.data.update()
-        bm.free()
+    return run_batch(objects, lambda object: random_vertex_group(object, number, radius, strength))
 def bleed_vertex_group_all_objects():
     objects = [obj for obj in bpy.context.selected_objects]
-    for object in objects:
-        bpy.ops.object.select_all(action='DESELECT')
-        object.select_set(True)
-        bpy.context.view_layer.objects.active = object
-        relations = get_object_relations(objects, object)
+    grid = TileGrid(objects)
+    def bleed_right(object):
+        relations = grid.relations(object)
         obj_right = relations[1]
         #obj_back = relations[2]
         border_main = get_border_verts_separate(object)
@@ -523,7 +734,7 @@ def bleed_vertex_group_all_objects():
         if obj_right is not None:
             border_right = get_border_verts_separate(obj_right)
         else:
-            continue
+            return None
         #border_back = None
         #if obj_back is not None:
         #    border_back = get_border_verts_separate(obj_back)
@@ -544,12 +755,12 @@ def bleed_vertex_group_all_objects():
         vgr = obj_right.vertex_groups.active
         deformr = bmr.verts.layers.deform.active
         vgir = obj_right.vertex_groups.active_index
-        for vindex in vMainRight:
-            vertex = object.data.vertices[vindex]
-            vert = nearest_vert_from_objects(object, obj_right, vertex)
+        nearest = nearest_verts_from_objects(object, obj_right, vMainRight)
+        left = vert_adjacency(object)['directions'][0]
+        for vindex, rindex in zip(vMainRight, nearest):
             bv = bm.verts[vindex]
             g = bv[deform]
-            bvr = bmr.verts[vert.index]
+            bvr = bmr.verts[rindex]
             gr = bvr[deformr]
             if vgi not in g:
                 g[vgi] = 0.0
@@ -561,13 +772,13 @@ def bleed_vertex_group_all_objects():
             trail_length = lerp(random.random(), 0.5, 0.8)#implied 0-10
             trail_inv = 1.0 / trail_length
             trail = 1.0
-            v = vertex
+            v = vindex
             while trail > 0.0:
                 trail -= trail_inv * 0.015 * diff
-                v = neighboring_vert_left(object, v)
-                if v is None:
+                v = int(left[v])
+                if v < 0:
                     break
-                bv = bm.verts[v.index]
+                bv = bm.verts[v]
                 g = bv[deform]
                 if vgi not in g:
                     g[vgi] = 0.0
@@ -579,14 +790,152 @@ def bleed_vertex_group_all_objects():
         object.data.update()
         bm.free()
         bmr.free()
+    return run_batch(objects, bleed_right)
+def grid_order(object, error=0.01):
+    #vertex indices laid out as a (rows, cols) grid, rows along +y and cols along +x
+    try:
+        return core.grid_layout(vert_coordinates(object)[:, :2], error)
+    except ValueError:
+        raise ValueError(object.name + ' is not a regular grid')
+def vert_uvs(object):
+    #per vertex uv of the active layer, loops of the same vertex are averaged
+    mesh = object.data
+    loops = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loops)
+    uv = np.empty(len(loops) * 2, dtype=np.float32)
+    mesh.uv_layers.active.data.foreach_get('uv', uv)
+    uv = uv.reshape(-1, 2)
+    count = np.maximum(np.bincount(loops, minlength=len(mesh.vertices)), 1)
+    return np.stack((np.bincount(loops, uv[:, 0], len(mesh.vertices)) / count, np.bincount(loops, uv[:, 1], len(mesh.vertices)) / count), axis=1)
+def tile_from_object(object, layers=(), coord=(0, 0)):
+    #layers are vertex group names, missing groups load as zeros
+    cache = get_mesh_cache(object)
+    order = cache.get('grid_order')
+    if order is None:
+        order = grid_order(object)
+        cache['grid_order'] = order
+    co = vert_coordinates(object)
+    tile = core.Tile(object.name, co[order, 2], coord, co[order[0], 0], co[order[:, 0], 1])
+    tile.order = order
+    groups = [object.vertex_groups.get(name) for name in layers]
+    present = [(name, vg.index) for name, vg in zip(layers, groups) if vg is not None]
+    weights = read_vertex_groups(object, [index for name, index in present]) if len(present) > 0 else []
+    for (name, index), values in zip(present, weights):
+        tile.set_layer(name, values[order])
+    for name, vg in zip(layers, groups):
+        if vg is None:
+            tile.layer(name)
+    return tile
+def tile_to_object(tile, object, layers=None, heights=False):
+    #writes the tile's layers back to vertex groups (created when missing), optionally the heights too
+    order = tile.order.ravel()
+    if heights:
+        co = vert_coordinates(object)
+        co[order, 2] = tile.heights.ravel()
+        object.data.vertices.foreach_set('co', co.ravel())
+        object.data.update()
+        invalidate_mesh_cache(object)
+    if layers is None:
+        layers = list(tile.layers.keys())
+    if len(layers) == 0:
+        return None
+    weights = []
+    for name in layers:
+        values = np.empty(len(order), dtype=np.float32)
+        values[order] = tile.layers[name].ravel()
+        weights.append(values)
+    write_vertex_groups(object, [vertex_group_index(object, name) for name in layers], weights)
+def tiles_from_objects(objects, layers=(), grid=None):
+    #{coord: Tile} keyed by TileGrid cells, tile names are the object names
+    if grid is None:
+        grid = TileGrid(objects)
+    tiles = {}
+    for object in objects:
+        coord = grid.coord(object)
+        if coord is None:
+            continue
+        tiles[coord] = tile_from_object(object, layers, coord)
+    return tiles
+def tiles_to_objects(tiles, layers=None, heights=False):
+    for tile in tiles.values():
+        object = bpy.data.objects.get(tile.name)
+        if object is not None:
+            tile_to_object(tile, object, layers, heights)
+def world_from_objects(objects, layers=(), grid=None):
+    #one stitched core.World over the tiles; each tile's arrays are views into it, store back with tiles_to_objects(world.tiles)
+    if grid is None:
+        grid = TileGrid(objects)
+    tiles = tiles_from_objects(objects, layers, grid)
+    overlap = 0
+    if len(tiles) > 0:
+        #border vertices coincide when a tile spans exactly one grid cell
+        tile = next(iter(tiles.values()))
+        step = float(tile.x[1] - tile.x[0]) if len(tile.x) > 1 else 0.0
+        if step > 0.0 and abs(float(tile.x[-1] - tile.x[0]) - grid.spacing[0]) < step * 0.5:
+            overlap = 1
+    return core.World(tiles, overlap)
+def open_weight_store(directory=None):
+    #defaults to <blend>.weights next to the file
+    if directory is None:
+        directory = bpy.path.abspath('//' + bpy.path.basename(bpy.data.filepath) + '.weights')
+    return store.WeightStore(directory)
+def store_from_object(weights, object, layers=None):
+    #vertex groups -> store in one pass, layers default to every group of the object
+    if layers is None:
+        layers = [vg.name for vg in object.vertex_groups]
+    present = [name for name in layers if name in object.vertex_groups]
+    values = read_vertex_groups(object, [object.vertex_groups[name].index for name in present]) if present else []
+    for name, column in zip(present, values):
+        weights.set_layer(object.name, name, column)
+    weights.close(object.name)
+    return present
+def store_to_object(weights, object, layers=None):
+    #store -> vertex groups (created when missing) in one pass, layers default to everything stored for the tile
+    if layers is None:
+        layers = weights.layers(object.name)
+    present = [name for name in layers if weights.has(object.name, name)]
+    count = len(object.data.vertices)
+    columns = [np.array(weights.layer(object.name, name, count)) for name in present]
+    if present:
+        write_vertex_groups(object, [vertex_group_index(object, name) for name in present], columns)
+    weights.close(object.name)
+    return present
+def store_weights_selected(directory=None, layers=None):
+    weights = open_weight_store(directory)
+    objects = [obj for obj in bpy.context.selected_objects if obj.type == 'MESH']
+    return run_batch(objects, lambda object: store_from_object(weights, object, layers))
+def load_weights_selected(directory=None, layers=None):
+    weights = open_weight_store(directory)
+    objects = [obj for obj in bpy.context.selected_objects if obj.type == 'MESH']
+    return run_batch(objects, lambda object: store_to_object(weights, object, layers))
+def bleed_seams_all_objects(group_name=None, seed=0, falloff=0.015, context=()):
+    #four direction seam bleed over the selected tiles, the group defaults to the active object's active group
+    #context tiles are loaded around the selection: only seams of selected tiles are bled, changed tiles are written
+    objects = [obj for obj in bpy.context.selected_objects if obj.type == 'MESH']
+    if group_name is None:
+        active = bpy.context.view_layer.objects.active or (objects[0] if objects else None)
+        if active is None or active.vertex_groups.active is None:
+            return 0
+        group_name = active.vertex_groups.active.name
+    names = set(obj.name for obj in objects)
+    tiles = tiles_from_objects(objects + [obj for obj in context if obj.name not in names], [group_name])
+    seams = None
+    if len(context) > 0:
+        seams = set((coord, side) for coord, tile in tiles.items() if tile.name in names for side in range(4))
+    before = dict((coord, core.content_hash([tile.layer(group_name)])) for coord, tile in tiles.items())
+    count = core.bleed_seams(tiles, group_name, seed, falloff, seams)
+    tiles_to_objects(dict((coord, tile) for coord, tile in tiles.items() if core.content_hash([tile.layer(group_name)]) != before[coord]), [group_name])
+    return count
 def origin_to_geo_grid():
     objects = [obj for obj in bpy.context.selected_objects]
-    for object in objects:
-        center = get_bounding_box_center(object)
+    centers = get_bounding_box_centers(objects)
+    for object, center in zip(objects, centers):
+        center = Vector(tuple(center))
         grid_center = Vector((center.x, center.y, 0))
         object.location = grid_center
         object.data.transform(Matrix.Translation(-grid_center))
         object.data.update()
+        invalidate_mesh_cache(object)
 def toggle_particles(with_name, toggle=True):
     objects = [obj for obj in bpy.context.selected_objects]
     for object in objects:
@@ -628,40 +977,147 @@ def HideRender(b=True):
         obj.hide_render = b
 #HideRender()
 alpha = ['A','B','C','D','E','F','G','H','I','J']
+#tile layout, replace with a bigger registry.TileRegistry for other grid sizes
+tiles = registry.default
 def NextName(input):
-    if input == 'J9B1':
-        return None
-    name = ''
-    if input[-1] == '0':
-        name = input[0] + input[1] + input[2] + '1'
-    else:
-        sub = input[-2]
-        if sub == 'A':
-            name = input[0] + input[1] + 'B0'
-        else:
-            num = input[1]
-            if num == '9':
-                name = alpha[alpha.index(input[0])+1] + '0A0'
-            else:
-                name = input[0] + str(int(num)+1) + 'A0'
-    return name
-def ExportColTexLoop():
-    object = bpy.context.view_layer.objects.active
+    return tiles.next(input)
+def tile_names(first='A0A0', last=None):
+    return tiles.range(first, last)
+def tile_entries(objects):
+    #{tile name: object and mesh name} for the registry manifest
+    return {obj.name: {'object': obj.name, 'mesh': obj.data.name} for obj in objects if obj.name in tiles}
+def write_tile_manifest(path=None, objects=None):
+    #defaults to <blend>.manifest.json next to the file
+    if objects is None:
+        objects = [obj for obj in bpy.context.scene.objects if obj.type == 'MESH']
+    if path is None:
+        path = bpy.path.abspath('//' + bpy.path.basename(bpy.data.filepath) + '.manifest.json')
+    return registry.save_manifest(path, tiles, tile_entries(objects))
+def tile_objects(names):
+    #direct lookup instead of walking the chain, tiles that do not exist are skipped
+    return [bpy.data.objects[name] for name in names if name in bpy.data.objects]
+export_dir = 'C:/Users/Kurai/incrementum_v0-20-10/Data/temp/'
+def bake_col_tex(object, directory=None):
+    #bakes the EMIT pass of one tile into its 'Col' image and saves it, object must be selected and active
+    if directory is None:
+        directory = export_dir
     object.hide_render = False
     bpy.ops.object.bake(type='EMIT', save_mode='EXTERNAL')
     #Assume that you hit bake
     tex_name = object.name + '_' + object.vertex_groups.active.name + '.png'
-    tex_name = 'C:/Users/Kurai/incrementum_v0-20-10/Data/temp/' + tex_name
+    tex_name = os.path.join(directory, tex_name)
     mat = object.data.materials[0]
     nodes = mat.node_tree.nodes
-    tex = tex = nodes.get('Col').image
+    tex = nodes.get('Col').image
     tex.save_render(filepath=tex_name)
     object.hide_render = True
+    return tex_name
+def export_col_tex(object, directory=None):
+    bpy.ops.object.select_all(action='DESELECT')
+    object.select_set(True)
+    bpy.context.view_layer.objects.active = object
+    tex_name = bake_col_tex(object, directory)
+    object.select_set(False)
+    return tex_name
+def ExportColTexSelected(directory=None):
+    objects = sorted([obj for obj in bpy.context.selected_objects], key=lambda obj: obj.name)
+    for object in objects:
+        export_col_tex(object, directory)
+def raster_vertex_groups(object, group_names, resolution=256, space='GRID'):
+    #weights of each group interpolated into a (resolution, resolution) image, no render engine involved
+    #space 'GRID' lays the vertices out by position, 'UV' by the active uv layer (both assume a regular grid)
+    if space == 'UV':
+        order = core.grid_layout(vert_uvs(object), 1e-4)
+    else:
+        cache = get_mesh_cache(object)
+        order = cache.get('grid_order')
+        if order is None:
+            order = grid_order(object)
+            cache['grid_order'] = order
+    #missing groups (or None) read as 0.0 instead of being created
+    indices = [object.vertex_groups[name].index if name is not None and name in object.vertex_groups else -1 for name in group_names]
+    weights = read_vertex_groups(object, indices)
+    images = core.resample(np.stack([w[order] for w in weights], axis=-1), resolution)
+    return [images[..., n] for n in range(len(weights))]
+def save_image(path, pixels, file_format='PNG', bit_depth=8):
+    #PNG is written directly, other formats (OPEN_EXR, ...) go through a temporary bpy image
+    if file_format == 'PNG':
+        return core.write_png(path, pixels, bit_depth)
+    pixels = np.asarray(pixels, dtype=np.float32)
+    if pixels.ndim == 2:
+        pixels = pixels[..., None]
+    height, width, channels = pixels.shape
+    rgba = np.ones((height, width, 4), dtype=np.float32)
+    rgba[..., :3] = pixels[..., [0, 0, 0]] if channels == 1 else pixels[..., :3]
+    if channels == 4:
+        rgba[..., 3] = pixels[..., 3]
+    image = bpy.data.images.new(os.path.basename(path), width, height, alpha=True, float_buffer=True)
+    image.pixels.foreach_set(rgba.ravel())
+    image.filepath_raw = path
+    image.file_format = file_format
+    image.save()
+    bpy.data.images.remove(image)
+    return path
+image_extensions = {'PNG': '.png', 'OPEN_EXR': '.exr', 'TIFF': '.tif'}
+def export_weight_tex(object, directory=None, group_name=None, resolution=256, file_format='PNG', bit_depth=8, space='GRID'):
+    #same file name ExportColTexLoop uses, written straight from the weights
+    if directory is None:
+        directory = export_dir
+    if group_name is None:
+        group_name = object.vertex_groups.active.name
+    tex_name = os.path.join(directory, object.name + '_' + group_name + image_extensions.get(file_format, '.png'))
+    pixels = raster_vertex_groups(object, [group_name], resolution, space)[0]
+    return save_image(tex_name, pixels, file_format, bit_depth)
+#image suffix -> vertex group per RGBA channel, None leaves the channel black
+splat_layout = {
+    'erosion_a': ['rainmap', 'scree', 'avalanced', 'water'],
+    'erosion_b': ['scour', 'deposit', 'flowrate', 'sediment'],
+    'erosion_c': ['sedimentpct', 'capacity', 'slope', None],
+}
+def export_splat_maps(object, directory=None, layout=None, resolution=256, file_format='PNG', bit_depth=8, space='GRID'):
+    #every group of the layout is read in one pass, each image is written once as <tile>_<suffix>
+    if directory is None:
+        directory = export_dir
+    if layout is None:
+        layout = splat_layout
+    names = [name for channels in layout.values() for name in channels]
+    channels = raster_vertex_groups(object, names, resolution, space)
+    paths = []
+    n = 0
+    for suffix, groups in layout.items():
+        pixels = np.stack(channels[n:n + len(groups)], axis=-1)
+        n += len(groups)
+        if pixels.shape[-1] == 2:
+            #2 channels would be grey + alpha
+            pixels = np.concatenate((pixels, np.zeros_like(pixels[..., :1])), axis=-1)
+        tex_name = os.path.join(directory, object.name + '_' + suffix + image_extensions.get(file_format, '.png'))
+        paths.append(save_image(tex_name, pixels, file_format, bit_depth))
+    return paths
+def write_splat_layout(directory=None, layout=None, resolution=256, bit_depth=8):
+    #channel mapping for whoever loads the images
+    if directory is None:
+        directory = export_dir
+    path = os.path.join(directory, 'splat_layout.json')
+    with open(path, 'w') as file:
+        json.dump({'resolution': resolution, 'bit_depth': bit_depth, 'images': layout or splat_layout, 'channels': 'RGBA'}, file, indent=2)
+    return path
+def ExportSplatSelected(directory=None, layout=None, resolution=256, file_format='PNG', bit_depth=8, space='GRID'):
+    objects = sorted([obj for obj in bpy.context.selected_objects if obj.type == 'MESH'], key=lambda obj: obj.name)
+    write_splat_layout(directory, layout, resolution, bit_depth)
+    return run_batch(objects, lambda object: export_splat_maps(object, directory, layout, resolution, file_format, bit_depth, space))
+def ExportWeightTexSelected(directory=None, resolution=256, file_format='PNG', bit_depth=8, space='GRID'):
+    objects = sorted([obj for obj in bpy.context.selected_objects if obj.type == 'MESH'], key=lambda obj: obj.name)
+    return run_batch(objects, lambda object: export_weight_tex(object, directory, None, resolution, file_format, bit_depth, space))
+def ExportColTexLoop():
+    object = bpy.context.view_layer.objects.active
+    bake_col_tex(object)
     object.select_set(False)
+    #Next Step, missing tiles are skipped instead of raising
     nextName = NextName(object.name)
+    while nextName is not None and nextName not in bpy.context.scene.objects:
+        nextName = NextName(nextName)
     if nextName is None:
         return None
-    #Next Step
     object = bpy.context.scene.objects[nextName]
     bpy.context.view_layer.objects.active = object
     object.hide_render = False